@@ -1,7 +1,137 @@
+from datetime import timedelta
+
 from django.contrib import admin
-from blog.models import Post, Tag, Comment
+from django.contrib.admin.widgets import AutocompleteSelectMultiple
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from blog.models import Post, Tag, Comment, PageView
+from blog.pagination import EstimatedCountPaginator
+
+
+PAGE_VIEWS_REPORT_DAYS = 30
+PAGE_VIEWS_TOP_POSTS = 20
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    """Посты без выпадающих списков на всех пользователей и теги.
+
+    Лайки и комментарии в списке берутся из счётчиков в самой таблице
+    постов, поэтому страница списка не делает запросов на каждую строку.
+    В форме поста лайков нет: у популярного поста их тысячи, и поле
+    выводило бы id каждого лайкнувшего. Вместо них показан счётчик.
+    """
+
+    list_display = [
+        'title', 'author', 'published_at', 'likes_count', 'comments_count']
+    list_select_related = ['author']
+    search_fields = ['title']
+    raw_id_fields = ['author']
+    exclude = ['likes']
+    readonly_fields = ['likes_count', 'comments_count']
+    autocomplete_fields = ['tags']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # анонс и HTML не показываются ни в списке, ни в форме, а HTML
+        # весит столько же, сколько сам текст
+        return super().get_queryset(request).defer(
+            'text', 'text_html', 'teaser')
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        # у связи с тегами своя модель, и Django прячет такие поля из
+        # формы. Теги всё так же меняются через set(), а дату публикации
+        # в связи проставляет сигнал
+        if db_field.name != 'tags':
+            return super().formfield_for_manytomany(
+                db_field, request, **kwargs)
+        kwargs.setdefault('widget', AutocompleteSelectMultiple(
+            db_field, self.admin_site, using=kwargs.get('using')))
+        return db_field.formfield(**kwargs)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['title', 'slug', 'posts_count']
+    search_fields = ['title']
+    prepopulated_fields = {'slug': ['title']}
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # подзапрос считает посты только у тегов с текущей страницы,
+        # а не группирует всю таблицу связей
+        posts_count = (
+            Post.tags.through.objects
+            .filter(tag_id=OuterRef('pk'))
+            .order_by()
+            .values('tag_id')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            posts_count=Coalesce(Subquery(posts_count), 0))
+
+    @admin.display(description='Число постов', ordering='posts_count')
+    def posts_count(self, tag):
+        return tag.posts_count
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ['author', 'post', 'published_at']
+    list_select_related = ['author', 'post']
+    raw_id_fields = ['author', 'post']
+    # по первичному ключу список читается по индексу, а не сортируется
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(
+            'text', 'post__text', 'post__text_html', 'post__teaser')
+
+
+@admin.register(PageView)
+class PageViewAdmin(admin.ModelAdmin):
+    """Поминутные строки просмотров и сводка по постам и дням над ними."""
+
+    list_display = ['path', 'post_slug', 'minute', 'views_count']
+    search_fields = ['post_slug']
+    ordering = ['-minute']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
 
-admin.site.register(Post)
-admin.site.register(Tag)
-admin.site.register(Comment)
+    def changelist_view(self, request, extra_context=None):
+        since = timezone.now() - timedelta(days=PAGE_VIEWS_REPORT_DAYS)
+        page_views = PageView.objects.filter(minute__gte=since)
+        views_by_day = (
+            page_views
+            .annotate(day=TruncDate('minute'))
+            .values('day')
+            .annotate(views=Sum('views_count'))
+            .order_by('-day')
+        )
+        views_by_post = (
+            page_views
+            .exclude(post_slug='')
+            .values('post_slug')
+            .annotate(views=Sum('views_count'))
+            .order_by('-views')[:PAGE_VIEWS_TOP_POSTS]
+        )
+        extra_context = {
+            **(extra_context or {}),
+            'report_days': PAGE_VIEWS_REPORT_DAYS,
+            'views_by_day': views_by_day,
+            'views_by_post': views_by_post,
+        }
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,176 @@
+from functools import partial, wraps
+
+from django.core.exceptions import BadRequest
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+
+from blog.db import reads_from_replica
+from blog.middleware import query_budget
+from blog.models import Comment, Post, Tag
+from blog.page_cache import (
+    FEED_SCOPE, SIDEBAR_SCOPE, cache_page_by_versions, get_post_scope,
+    get_tag_scope)
+from blog.pagination import (
+    TAG_POSTS_PER_PAGE, paginate_by_keyset, paginate_comments,
+    paginate_tag_posts)
+from blog.serializers import (
+    COMMENT_FIELDS, POST_CARD_FIELDS, POST_FIELDS, TAG_FIELDS,
+    select_comment_fields, select_fields, select_post_fields,
+    serialize_comment, serialize_post, serialize_tag)
+from blog.slug_cache import get_post_or_404
+
+
+API_POSTS_PER_PAGE = 20
+API_TAGS_PER_PAGE = 100
+POST_DETAIL_FIELDS = [
+    'title', 'text', 'author', 'comments_amount', 'likes_amount',
+    'image_url', 'image_srcsets', 'published_at', 'slug', 'tags',
+]
+
+
+def json_bad_request(view):
+    """Отдаёт ошибку разбора параметров как JSON, а не HTML-страницу 400."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+    return wrapper
+
+
+def get_requested_fields(request, available_fields, default_fields):
+    """Разбирает параметр `fields` — имена полей через запятую."""
+    raw_fields = request.GET.get('fields')
+    if raw_fields is None:
+        return list(default_fields)
+    fields = list(dict.fromkeys(
+        field.strip() for field in raw_fields.split(',') if field.strip()))
+    unknown_fields = [
+        field for field in fields if field not in available_fields]
+    if not fields or unknown_fields:
+        raise BadRequest(
+            f"Неизвестные поля: {', '.join(unknown_fields)}. "
+            f"Доступны: {', '.join(available_fields)}"
+        )
+    return fields
+
+
+def get_cursor_url(request, **cursor):
+    query = request.GET.copy()
+    for name in ('after', 'before'):
+        query.pop(name, None)
+    query.update(cursor)
+    return f'{request.path}?{query.urlencode()}'
+
+
+def serialize_keyset_page(request, keyset_page):
+    previous_url = next_url = None
+    if keyset_page.previous_cursor:
+        previous_url = get_cursor_url(
+            request, before=keyset_page.previous_cursor)
+    if keyset_page.next_cursor:
+        next_url = get_cursor_url(request, after=keyset_page.next_cursor)
+    return {'previous_url': previous_url, 'next_url': next_url}
+
+
+def serialize_posts_page(request, posts, per_page,
+                         paginate=paginate_by_keyset):
+    fields = get_requested_fields(request, POST_FIELDS, POST_CARD_FIELDS)
+    posts_page = paginate(
+        select_post_fields(posts, fields),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=per_page,
+    )
+    return {
+        'posts': [serialize_post(post, fields) for post in posts_page.objects],
+        **serialize_keyset_page(request, posts_page),
+    }
+
+
+@query_budget(2)
+@gzip_page
+@reads_from_replica
+@cache_page_by_versions(lambda: [FEED_SCOPE])
+@json_bad_request
+def posts_list(request):
+    return JsonResponse(
+        serialize_posts_page(request, Post.objects.all(), API_POSTS_PER_PAGE))
+
+
+@query_budget(2)
+@gzip_page
+@reads_from_replica
+@cache_page_by_versions(lambda slug: [get_post_scope(slug)])
+@json_bad_request
+def post_detail(request, slug):
+    fields = get_requested_fields(request, POST_FIELDS, POST_DETAIL_FIELDS)
+    post = get_post_or_404(
+        select_post_fields(Post.objects.all(), fields), slug)
+    return JsonResponse(serialize_post(post, fields))
+
+
+@query_budget(2)
+@gzip_page
+@reads_from_replica
+@cache_page_by_versions(lambda slug: [get_post_scope(slug)])
+@json_bad_request
+def post_comments(request, slug):
+    fields = get_requested_fields(request, COMMENT_FIELDS, COMMENT_FIELDS)
+    post = get_post_or_404(Post.objects.only('id'), slug)
+    comments, next_cursor = paginate_comments(
+        select_comment_fields(Comment.objects.filter(post=post), fields),
+        after=request.GET.get('after'),
+    )
+    return JsonResponse({
+        'comments': [
+            serialize_comment(comment, fields) for comment in comments],
+        'next_url': (
+            get_cursor_url(request, after=next_cursor)
+            if next_cursor else None),
+    })
+
+
+@query_budget(1)
+@gzip_page
+@reads_from_replica
+@cache_page_by_versions(lambda: [SIDEBAR_SCOPE])
+@json_bad_request
+def tags_list(request):
+    """Теги по алфавиту, курсор `after` — название последнего тега."""
+    fields = get_requested_fields(request, TAG_FIELDS, TAG_FIELDS)
+    tags = select_fields(
+        Tag.objects.order_by('title'), ['title', *fields], TAG_FIELDS)
+    if 'posts_with_tag' in fields:
+        tags = tags.popular().order_by('title')
+    after = request.GET.get('after')
+    if after:
+        tags = tags.filter(title__gt=after)
+    tags = list(tags[:API_TAGS_PER_PAGE + 1])
+
+    next_url = None
+    if len(tags) > API_TAGS_PER_PAGE:
+        tags = tags[:API_TAGS_PER_PAGE]
+        next_url = get_cursor_url(request, after=tags[-1].title)
+    return JsonResponse({
+        'tags': [serialize_tag(tag, fields) for tag in tags],
+        'next_url': next_url,
+    })
+
+
+@query_budget(4)
+@gzip_page
+@reads_from_replica
+@cache_page_by_versions(
+    lambda tag_slug: [get_tag_scope(tag_slug), FEED_SCOPE])
+@json_bad_request
+def tag_posts(request, tag_slug):
+    tag = get_object_or_404(Tag.objects.only('id'), slug=tag_slug)
+    return JsonResponse(serialize_posts_page(
+        request,
+        Post.objects.all(),
+        TAG_POSTS_PER_PAGE,
+        paginate=partial(paginate_tag_posts, tag_id=tag.id),
+    ))
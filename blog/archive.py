@@ -0,0 +1,109 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest, TruncMonth
+from django.utils import timezone
+
+from blog.models import ArchiveMonth, Post
+
+
+ARCHIVE_MONTHS_CACHE_KEY = 'sidebar:archive_months'
+
+
+def get_month(published_at):
+    """Первый день месяца публикации в часовом поясе сайта."""
+    return timezone.localtime(published_at).date().replace(day=1)
+
+
+def get_month_range(year, month):
+    """Границы месяца `[начало, начало следующего)` для фильтра постов.
+
+    Полуоткрытый диапазон по `published_at` SQLite и Postgres читают
+    из индекса по дате публикации, не вычисляя месяц для каждой строки.
+    Для несуществующего месяца бросает ValueError.
+    """
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return (
+        timezone.make_aware(datetime.combine(start, datetime.min.time())),
+        timezone.make_aware(datetime.combine(end, datetime.min.time())),
+    )
+
+
+def change_archive_counts(deltas):
+    """Сдвигает счётчики месяцев: `deltas` — месяц и на сколько постов.
+
+    Строка месяца заводится при первом посте, а опустевшие месяцы
+    удаляются, чтобы не попадать в сайдбар.
+    """
+    deltas = {month: delta for month, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for month, delta in deltas.items():
+            if delta > 0:
+                ArchiveMonth.objects.get_or_create(month=month)
+            ArchiveMonth.objects.filter(month=month).update(
+                posts_count=Greatest(F('posts_count') + delta, 0))
+        ArchiveMonth.objects.filter(
+            month__in=deltas, posts_count=0).delete()
+    invalidate_archive_months()
+
+
+def rebuild_archive_months():
+    """Пересчитывает все месяцы одним GROUP BY по постам.
+
+    Нужен после массовых правок мимо сигналов: `bulk_create`,
+    `update()` дат публикации, ручных правок базы. Возвращает число
+    месяцев с постами.
+    """
+    rows = (
+        Post.objects
+        .annotate(month=TruncMonth('published_at'))
+        .values_list('month')
+        .annotate(posts_count=Count('id'))
+        .order_by()
+    )
+    months = {month.date(): posts_count for month, posts_count in rows}
+    with transaction.atomic():
+        ArchiveMonth.objects.all().delete()
+        ArchiveMonth.objects.bulk_create(
+            ArchiveMonth(month=month, posts_count=posts_count)
+            for month, posts_count in months.items()
+        )
+    invalidate_archive_months()
+    return len(months)
+
+
+def get_archive_months():
+    """Месяцы с числом постов для сайдбара, новые сверху.
+
+    Таблица месяцев маленькая, но список нужен на каждой странице,
+    поэтому кэшируется так же, как популярные теги.
+    """
+    archive_months = cache.get(ARCHIVE_MONTHS_CACHE_KEY)
+    if archive_months is not None:
+        return archive_months
+
+    archive_months = [
+        {
+            'year': archive_month.month.year,
+            'month': archive_month.month.month,
+            'date': archive_month.month,
+            'posts_count': archive_month.posts_count,
+        }
+        for archive_month in ArchiveMonth.objects.all()
+    ]
+    cache.set(
+        ARCHIVE_MONTHS_CACHE_KEY,
+        archive_months,
+        settings.SIDEBAR_CACHE_TIMEOUT,
+    )
+    return archive_months
+
+
+def invalidate_archive_months():
+    cache.delete(ARCHIVE_MONTHS_CACHE_KEY)
@@ -0,0 +1,169 @@
+import asyncio
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, render
+from django.urls import reverse
+
+from blog.archive import get_archive_months
+from blog.db import reads_from_replica, run_in_thread
+from blog.middleware import query_budget
+from blog.models import Post, Tag
+from blog.page_cache import (
+    FEED_SCOPE, RELATED_SCOPE, SIDEBAR_SCOPE, aattach_cache_versions,
+    aget_versions, cache_page_by_versions, get_post_scope, get_tag_scope)
+from blog.pagination import paginate_by_keyset, paginate_tag_posts
+from blog.serializers import select_post_fields, serialize_post
+from blog.sidebar import get_popular_tags
+from blog.slug_cache import aget_post_or_404
+from blog.views import (
+    get_comments_chunk, get_comments_dates, get_most_popular_posts,
+    get_page_number, get_related_posts, is_liked, serialize_pagination,
+    serialize_post_detail, set_last_modified)
+
+
+async def aget_most_popular_posts():
+    return [serialize_post(post) async for post in get_most_popular_posts()]
+
+
+async def aget_fragment_cache_context():
+    return {
+        'fragment_cache_timeout': settings.PAGE_CACHE_TIMEOUT,
+        'cache_versions': await aget_versions(SIDEBAR_SCOPE),
+    }
+
+
+@query_budget(7)
+@reads_from_replica
+@cache_page_by_versions(lambda page=1: [FEED_SCOPE, SIDEBAR_SCOPE])
+async def index(request, page=1):
+    (
+        posts_page,
+        most_popular_posts,
+        popular_tags,
+        archive_months,
+        fragment_context,
+    ) = await asyncio.gather(
+        run_in_thread(
+            paginate_by_keyset,
+            select_post_fields(Post.objects.all()),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            page=get_page_number(page),
+        ),
+        aget_most_popular_posts(),
+        run_in_thread(get_popular_tags),
+        run_in_thread(get_archive_months),
+        aget_fragment_cache_context(),
+    )
+    if not posts_page.objects and page > 1:
+        raise Http404('Такой страницы нет')
+
+    def get_page_url(number, **cursor):
+        return f"{reverse('index', args=[number])}?{urlencode(cursor)}"
+
+    context = {
+        'most_popular_posts': most_popular_posts,
+        'page_posts': await aattach_cache_versions(
+            [serialize_post(post) for post in posts_page.objects]),
+        'pagination': serialize_pagination(posts_page, page, get_page_url),
+        'popular_tags': popular_tags,
+        'archive_months': archive_months,
+        **fragment_context,
+    }
+    return render(request, 'index.html', context)
+
+
+@query_budget(10)
+@reads_from_replica
+@cache_page_by_versions(
+    lambda slug: [get_post_scope(slug), SIDEBAR_SCOPE, RELATED_SCOPE])
+async def post_detail(request, slug):
+    # пользователь уже загружен кэшем страниц, здесь он берётся из запроса
+    user = await request.auser()
+    post = await aget_post_or_404(
+        Post.objects.prefetch_tags_with_counts().defer('text', 'teaser'),
+        slug)
+    (
+        (serialized_comments, comments_next_url),
+        related_posts,
+        most_popular_posts,
+        popular_tags,
+        archive_months,
+        last_comment_published_at,
+        fragment_context,
+        liked,
+    ) = await asyncio.gather(
+        run_in_thread(get_comments_chunk, post.id, post.slug),
+        run_in_thread(get_related_posts, post.id),
+        aget_most_popular_posts(),
+        run_in_thread(get_popular_tags),
+        run_in_thread(get_archive_months),
+        get_comments_dates(post).afirst(),
+        aget_fragment_cache_context(),
+        run_in_thread(is_liked, post.id, user),
+    )
+
+    context = {
+        'post': serialize_post_detail(
+            post, serialized_comments, comments_next_url),
+        'related_posts': related_posts,
+        'popular_tags': popular_tags,
+        'archive_months': archive_months,
+        'most_popular_posts': most_popular_posts,
+        'liked': liked,
+        # шаблон проверяет `user.is_authenticated`, а ленивый
+        # `request.user` из синхронного рендера в async view не загрузить
+        'user': user,
+        **fragment_context,
+    }
+    response = render(request, 'post-details.html', context)
+    set_last_modified(response, post, last_comment_published_at)
+    return response
+
+
+@query_budget(8)
+@reads_from_replica
+@cache_page_by_versions(
+    lambda tag_slug: [get_tag_scope(tag_slug), SIDEBAR_SCOPE])
+async def tag_filter(request, tag_slug):
+    tag = await aget_object_or_404(Tag, slug=tag_slug)
+
+    page = get_page_number(request.GET.get('page', 1))
+    (
+        posts_page,
+        most_popular_posts,
+        popular_tags,
+        archive_months,
+        fragment_context,
+    ) = await asyncio.gather(
+        run_in_thread(
+            paginate_tag_posts,
+            select_post_fields(Post.objects.all()),
+            tag.id,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            page=page,
+        ),
+        aget_most_popular_posts(),
+        run_in_thread(get_popular_tags),
+        run_in_thread(get_archive_months),
+        aget_fragment_cache_context(),
+    )
+
+    def get_page_url(number, **cursor):
+        query = urlencode({'page': number, **cursor})
+        return f"{reverse('tag_filter', args=[tag.slug])}?{query}"
+
+    context = {
+        'tag': tag.title,
+        'popular_tags': popular_tags,
+        'archive_months': archive_months,
+        'posts': await aattach_cache_versions(
+            [serialize_post(post) for post in posts_page.objects]),
+        'pagination': serialize_pagination(posts_page, page, get_page_url),
+        'most_popular_posts': most_popular_posts,
+        **fragment_context,
+    }
+    return render(request, 'posts-list.html', context)
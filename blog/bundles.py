@@ -0,0 +1,82 @@
+import os
+import posixpath
+import re
+
+import rcssmin
+import rjsmin
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+
+BUNDLES_PREFIX = 'bundles'
+
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+ABSOLUTE_URL_RE = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|/|#)', re.IGNORECASE)
+
+
+def get_bundle_name(name):
+    return posixpath.join(BUNDLES_PREFIX, name)
+
+
+def rebase_css_urls(css, source_name, bundle_name):
+    """Переписывает относительные `url()` так, чтобы они вели из бандла.
+
+    Шрифты и картинки остаются на своих местах, а CSS переезжает
+    в каталог бандлов, поэтому `url(fonts/x.woff)` из
+    `vendors/themify-icons/` превращается в
+    `url(../vendors/themify-icons/fonts/x.woff)`.
+    """
+    source_dir = posixpath.dirname(source_name)
+    bundle_dir = posixpath.dirname(bundle_name)
+
+    def rebase(match):
+        quote, url = match.groups()
+        if ABSOLUTE_URL_RE.match(url):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(source_dir, path))
+        rebased = posixpath.relpath(target, bundle_dir)
+        return f'url({quote}{rebased}{suffix}{quote})'
+
+    return CSS_URL_RE.sub(rebase, css)
+
+
+def read_static_file(name):
+    path = finders.find(name)
+    if path is None:
+        raise FileNotFoundError(f'Статический файл {name} не найден')
+    with open(path, encoding='utf-8') as static_file:
+        return static_file.read()
+
+
+def build_bundle(name):
+    """Склеивает и минифицирует файлы бандла из `STATIC_BUNDLES`."""
+    bundle_name = get_bundle_name(name)
+    sources = settings.STATIC_BUNDLES[name]
+    if name.endswith('.css'):
+        return '\n'.join(
+            rcssmin.cssmin(rebase_css_urls(
+                read_static_file(source), source, bundle_name))
+            for source in sources
+        )
+    # точка с запятой защищает от файлов, которые ею не заканчиваются
+    return ';\n'.join(
+        rjsmin.jsmin(read_static_file(source)) for source in sources)
+
+
+def write_bundle(name):
+    """Записывает бандл и сообщает, изменился ли он.
+
+    Неизменившийся файл не перезаписывается, чтобы collectstatic
+    по времени изменения понял, что копировать его заново не нужно.
+    """
+    content = build_bundle(name)
+    path = os.path.join(settings.STATIC_BUNDLES_DIR, name)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as bundle_file:
+            if bundle_file.read() == content:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as bundle_file:
+        bundle_file.write(content)
+    return True
@@ -0,0 +1,105 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+REPLICA_ALIAS_PREFIX = 'replica'
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+def get_replica_aliases():
+    return [
+        alias for alias in settings.DATABASES
+        if alias.startswith(REPLICA_ALIAS_PREFIX)
+    ]
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite.
+
+    WAL позволяет читателям не блокировать писателя, а `busy_timeout`
+    заставляет писателей ждать блокировку вместо немедленной ошибки
+    «database is locked». Значения берутся из `SQLITE_PRAGMAS`.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if connection.alias.startswith(REPLICA_ALIAS_PREFIX):
+            cursor.execute('PRAGMA query_only = ON')
+
+
+@contextmanager
+def read_from_replica():
+    token = use_replica.set(True)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+def reads_from_replica(view):
+    """Отправляет чтения view в реплику, если реплики настроены."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with read_from_replica():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with read_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """Выполняет синхронный код с запросами к базе в отдельном потоке.
+
+    Async ORM Django выполняет все запросы одного HTTP-запроса по очереди
+    в одном потоке, и `asyncio.gather` над ними ничего не ускоряет. Здесь
+    у каждого вызова свой поток и своё соединение, поэтому независимые
+    запросы идут к базе одновременно. Флаг реплики переезжает в поток
+    вместе с контекстом.
+    """
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+class ReadReplicaRouter:
+    """Направляет чтения в реплики внутри `read_from_replica`.
+
+    Вне этого контекста, а значит и в запросах, которые пишут в базу,
+    всё идёт в `default`, чтобы не читать устаревшие данные сразу
+    после записи.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replica_aliases()
+        if replicas and use_replica.get():
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,222 @@
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import http_date
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.decorators.gzip import gzip_page
+
+from blog.db import reads_from_replica
+from blog.middleware import query_budget
+from blog.models import Post, PostTag, Tag
+from blog.page_cache import SYNDICATION_SCOPE, get_versions, make_page_key
+from blog.serializers import select_post_fields
+
+
+FEED_ITEMS_AMOUNT = 20
+FEED_FIELDS = ['title', 'teaser_text', 'author', 'slug', 'tags']
+
+
+class StreamingFeedMixin:
+    """Лента, которая пишется по одному посту, а не целиком в память.
+
+    `start` и `end` повторяют `write` генератора Django до и после
+    списка записей. Дата обновления ленты берётся из `latest_date`:
+    записи не копятся в `items`, и посчитать её по ним нельзя.
+    """
+
+    latest_date = None
+
+    def latest_post_date(self):
+        return self.latest_date or super().latest_post_date()
+
+    def iterate(self, items):
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(
+            buffer, 'utf-8', short_empty_elements=True)
+
+        def flush():
+            content = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return content.encode()
+
+        handler.startDocument()
+        self.start(handler)
+        yield flush()
+        for item in items:
+            self.add_item(**item)
+            item = self.items.pop()
+            handler.startElement(
+                self.item_element, self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield flush()
+        self.end(handler)
+        yield flush()
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    item_element = 'item'
+
+    def start(self, handler):
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    item_element = 'entry'
+
+    def start(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        handler.endElement('feed')
+
+
+FEED_FORMATS = {
+    'rss': StreamingRssFeed,
+    'atom': StreamingAtomFeed,
+}
+
+
+def get_feed_class(feed_format):
+    try:
+        return FEED_FORMATS[feed_format]
+    except KeyError:
+        raise Http404('Такого формата ленты нет')
+
+
+def serialize_feed_item(request, post):
+    link = request.build_absolute_uri(post.get_absolute_url())
+    return {
+        'title': post.title,
+        'link': link,
+        'unique_id': link,
+        'description': post.teaser,
+        'author_name': post.author.username,
+        'pubdate': post.published_at,
+        'categories': [tag.title for tag in post.tags.all()],
+    }
+
+
+def iterate_and_cache(chunks, feed_key, cached_feed):
+    # в кэш попадает только лента, которую дочитали до конца
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cached_feed['content'] = b''.join(content)
+    cache.set(feed_key, cached_feed, settings.PAGE_CACHE_TIMEOUT)
+
+
+def get_conditional_feed_response(request, response, cached_feed):
+    """Ставит валидаторы и заменяет ответ на 304, если лента не менялась."""
+    response['ETag'] = cached_feed['etag']
+    response['Last-Modified'] = http_date(cached_feed['last_modified'])
+    return get_conditional_response(
+        request,
+        etag=cached_feed['etag'],
+        last_modified=cached_feed['last_modified'],
+        response=response,
+    )
+
+
+def serve_feed(request, feed_format, get_feed_source):
+    """Отдаёт ленту из кэша или строит её заново.
+
+    Версия `SYNDICATION_SCOPE` поднимается только при сохранении и
+    удалении постов и смене их тегов, поэтому лайки и комментарии кэш
+    лент не сбрасывают. Пока версия не сменилась, лента и условные GET
+    обслуживаются из кэша, не обращаясь к базе. `get_feed_source`
+    вызывается только при промахе и возвращает посты, заголовок и
+    адрес страницы ленты. `Last-Modified` — дата самого свежего поста.
+    """
+    feed_class = get_feed_class(feed_format)
+    version = get_versions(SYNDICATION_SCOPE)[SYNDICATION_SCOPE]
+    # в ленте абсолютные ссылки, поэтому схема и хост входят в ключ
+    feed_key = make_page_key(
+        request, {SYNDICATION_SCOPE: version}, absolute=True)
+    cached_feed = cache.get(feed_key)
+    if cached_feed is not None:
+        response = HttpResponse(
+            cached_feed['content'], content_type=cached_feed['content_type'])
+        return get_conditional_feed_response(request, response, cached_feed)
+
+    posts, title, link = get_feed_source()
+    posts = list(
+        select_post_fields(posts, FEED_FIELDS)
+        .order_by('-published_at', '-id')[:FEED_ITEMS_AMOUNT]
+    )
+    latest_date = posts[0].published_at if posts else None
+    cached_feed = {
+        'etag': f'"{feed_key.split(":", 1)[1]}"',
+        'last_modified': int(
+            latest_date.timestamp() if latest_date else version),
+        'content_type': feed_class.content_type,
+    }
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=title,
+        language=settings.LANGUAGE_CODE,
+        feed_url=request.build_absolute_uri(),
+    )
+    feed.latest_date = latest_date
+    items = (serialize_feed_item(request, post) for post in posts)
+    response = StreamingHttpResponse(
+        iterate_and_cache(feed.iterate(items), feed_key, cached_feed),
+        content_type=feed_class.content_type,
+    )
+    conditional_response = get_conditional_feed_response(
+        request, response, cached_feed)
+    if conditional_response is not response:
+        # клиенту тело не нужно, но лента дописывается в кэш, иначе
+        # каждый условный запрос при промахе снова строил бы её из базы
+        for _ in response.streaming_content:
+            pass
+    return conditional_response
+
+
+@query_budget(2)
+@gzip_page
+@reads_from_replica
+def posts_feed(request, feed_format):
+    def get_feed_source():
+        return Post.objects.all(), 'Sensive Blog', reverse('index')
+
+    return serve_feed(request, feed_format, get_feed_source)
+
+
+@query_budget(3)
+@gzip_page
+@reads_from_replica
+def tag_feed(request, tag_slug, feed_format):
+    def get_feed_source():
+        tag = get_object_or_404(
+            Tag.objects.only('title', 'slug'), slug=tag_slug)
+        # свежие посты тега берутся из индекса связей, а не сортировкой
+        # всех постов тега
+        posts_ids = (
+            PostTag.objects.filter(tag=tag)
+            .order_by('-published_at', '-post_id')
+            .values('post_id')[:FEED_ITEMS_AMOUNT]
+        )
+        return (
+            Post.objects.filter(pk__in=posts_ids),
+            f'Sensive Blog: #{tag.title}',
+            tag.get_absolute_url(),
+        )
+
+    return serve_feed(request, feed_format, get_feed_source)
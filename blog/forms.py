@@ -0,0 +1,11 @@
+from django import forms
+
+from blog.models import Comment
+
+
+class CommentForm(forms.ModelForm):
+    text = forms.CharField(min_length=2, max_length=2000, strip=True)
+
+    class Meta:
+        model = Comment
+        fields = ['text']
@@ -0,0 +1,107 @@
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+
+from blog.models import PageView, Post
+from blog.tasks import BackgroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+def write_page_views(hits, batch_size):
+    """Прибавляет просмотры к поминутным строкам одним UPSERT на пачку.
+
+    `hits` — счётчик `{(path, post_slug, minute): views}`, где `minute` —
+    номер минуты от начала эпохи. Если строка за эту минуту уже есть,
+    база сама прибавляет к ней новые просмотры. Счётчики просмотров
+    постов обновляются одним UPDATE с `CASE` на пачку.
+    """
+    table = PageView._meta.db_table
+    rows = list(hits.items())
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for (path, post_slug, minute), views in batch:
+                minute_start = datetime.fromtimestamp(
+                    minute * 60, timezone.utc)
+                params.extend([
+                    path,
+                    post_slug,
+                    connection.ops.adapt_datetimefield_value(minute_start),
+                    views,
+                ])
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(path, post_slug, minute, views_count) VALUES {values} '
+                f'ON CONFLICT (path, minute) DO UPDATE SET '
+                f'views_count = {table}.views_count + excluded.views_count',
+                params,
+            )
+        update_posts_views(hits, batch_size)
+
+
+def update_posts_views(hits, batch_size):
+    views_by_slug = Counter()
+    for (path, post_slug, minute), views in hits.items():
+        if post_slug:
+            views_by_slug[post_slug] += views
+    slugs = list(views_by_slug)
+    for start in range(0, len(slugs), batch_size):
+        batch = slugs[start:start + batch_size]
+        Post.objects.filter(slug__in=batch).update(
+            views_count=F('views_count') + Case(
+                *(When(slug=slug, then=Value(views_by_slug[slug]))
+                  for slug in batch),
+                default=Value(0),
+            ),
+            trending_stale=True,
+        )
+
+
+class HitCounter(BackgroundWorker):
+    """Считает просмотры страниц в памяти процесса.
+
+    Запись просмотра — это прибавка к `Counter` под блокировкой, без
+    обращения к базе. Раз в `PAGE_VIEWS_FLUSH_INTERVAL` секунд и при
+    штатной остановке процесса накопленное сворачивается в поминутные
+    строки `PageView` через `write_page_views`. Если запись не удалась,
+    просмотры возвращаются в счётчик до следующей попытки.
+    """
+
+    def __init__(self, flush_interval, batch_size):
+        super().__init__('page-views', flush_interval)
+        self.batch_size = batch_size
+        self.hits = Counter()
+
+    def record(self, path, post_slug=''):
+        minute = int(time.time() // 60)
+        with self.lock:
+            self.hits[path, post_slug, minute] += 1
+        self.ensure_started()
+
+    def write_pending(self):
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+        if not hits:
+            return
+        try:
+            write_page_views(hits, self.batch_size)
+        except Exception:
+            logger.exception(
+                'Не удалось записать %s просмотров', hits.total())
+            with self.lock:
+                self.hits.update(hits)
+
+
+hit_counter = HitCounter(
+    flush_interval=settings.PAGE_VIEWS_FLUSH_INTERVAL,
+    batch_size=settings.PAGE_VIEWS_FLUSH_BATCH_SIZE,
+)
@@ -0,0 +1,109 @@
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+
+current_stats = ContextVar('current_stats', default=None)
+
+IN_PARAMS_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries_count = 0
+        self.view_queries_start = 0
+        self.user_authenticated = None
+        self.sql_seconds = 0
+        self.render_seconds = 0
+        self.sql_templates = Counter()
+        self.callers = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started_at
+            self.queries_count += 1
+            template = IN_PARAMS_RE.sub('(...)', sql)
+            self.sql_templates[template] += 1
+            if template not in self.callers:
+                self.callers[template] = find_caller()
+
+    def start_view(self):
+        """Отсюда запросы считаются запросами view и идут в её лимит."""
+        self.view_queries_start = self.queries_count
+
+    @property
+    def view_queries_count(self):
+        return self.queries_count - self.view_queries_start
+
+    def get_repeated_queries(self, threshold):
+        return [
+            {
+                'sql': template,
+                'count': count,
+                'caller': self.callers[template],
+            }
+            for template, count in self.sql_templates.most_common()
+            if count >= threshold
+        ]
+
+
+def find_caller():
+    """Ищет в стеке ближайшую функцию из `QUERY_INSTRUMENTATION_MODULES`."""
+    frame = sys._getframe(2)
+    while frame:
+        module = frame.f_globals.get('__name__', '')
+        if module in settings.QUERY_INSTRUMENTATION_MODULES:
+            return f'{module}.{frame.f_code.co_name}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+@contextmanager
+def collect_stats():
+    """Собирает запросы ко всем базам и время рендера шаблонов в блоке."""
+    stats = RequestStats()
+    token = current_stats.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield stats
+    finally:
+        current_stats.reset(token)
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        stats = current_stats.get()
+        if stats is None:
+            return super().render(context, request)
+        started_at = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.render_seconds += time.perf_counter() - started_at
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблоны Django, которые засекают время рендера для `collect_stats`.
+
+    Вне замеров шаблон рендерится как обычно, без лишней работы.
+    """
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
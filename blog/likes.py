@@ -0,0 +1,171 @@
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from blog.models import Post
+from blog.page_cache import SIDEBAR_SCOPE, bump_versions, get_post_scope
+from blog.tasks import BackgroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+def write_likes(states, batch_size):
+    """Записывает состояния лайков в базу и возвращает id изменённых постов.
+
+    `states` — словарь `{(post_id, user_id): liked}`. Какие лайки уже
+    есть, выясняется внутри транзакции, поэтому счётчик меняется ровно
+    на число реально добавленных и удалённых строк — одним UPDATE с
+    `F()` на пост, сколько бы лайков у него ни накопилось.
+    """
+    Like = Post.likes.through
+    keys = list(states)
+    likes_deltas = Counter()
+    with transaction.atomic():
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            existing = set(
+                Like.objects.filter(
+                    post_id__in={post_id for post_id, _ in batch},
+                    user_id__in={user_id for _, user_id in batch},
+                ).values_list('post_id', 'user_id')
+            )
+            added = [
+                key for key in batch if states[key] and key not in existing]
+            removed_by_post = defaultdict(list)
+            for post_id, user_id in batch:
+                if not states[post_id, user_id] and (
+                        (post_id, user_id) in existing):
+                    removed_by_post[post_id].append(user_id)
+
+            Like.objects.bulk_create(
+                [Like(post_id=post_id, user_id=user_id)
+                 for post_id, user_id in added],
+                ignore_conflicts=True,
+            )
+            for post_id, users_ids in removed_by_post.items():
+                Like.objects.filter(
+                    post_id=post_id, user_id__in=users_ids).delete()
+                likes_deltas[post_id] -= len(users_ids)
+            for post_id, _ in added:
+                likes_deltas[post_id] += 1
+
+        for post_id, delta in likes_deltas.items():
+            if delta:
+                Post.objects.filter(pk=post_id).update(
+                    likes_count=F('likes_count') + delta,
+                    trending_stale=True,
+                )
+    return [post_id for post_id, delta in likes_deltas.items() if delta]
+
+
+def bump_likes_versions(posts_ids):
+    """Сбрасывает кэш страниц постов с новыми лайками и сайдбара.
+
+    Лайки к этому моменту уже в базе, поэтому ошибка здесь только
+    пишется в лог: страницы обновятся со следующей пачкой или по
+    таймауту кэша, а записанное не пропадёт и не запишется повторно.
+    """
+    try:
+        slugs = Post.objects.filter(
+            pk__in=posts_ids).values_list('slug', flat=True)
+        # сайдбар сбрасывается раз на пачку лайков, а не на каждый
+        bump_versions(
+            SIDEBAR_SCOPE, *(get_post_scope(slug) for slug in slugs))
+    except Exception:
+        logger.exception(
+            'Не удалось сбросить кэш страниц %s постов', len(posts_ids))
+
+
+class LikesBuffer(BackgroundWorker):
+    """Копит лайки в памяти процесса и пишет их в базу пачками.
+
+    На популярный пост приходят тысячи лайков в секунду, и запись каждого
+    отдельной транзакцией упирается в блокировку одной строки счётчика.
+    Буфер хранит последнее желаемое состояние пары пост-пользователь,
+    поэтому лайк и тут же снятый лайк не доходят до базы вовсе. Раз в
+    `LIKES_FLUSH_INTERVAL` секунд, при переполнении буфера и при штатном
+    завершении процесса накопленное записывается через `write_likes`,
+    после чего сбрасываются кэши страниц изменённых постов и сайдбара.
+    Пока запись не случилась, `get_pending_delta` подсказывает, насколько
+    счётчик в базе отстаёт от буфера.
+    """
+
+    def __init__(self, flush_interval, max_size, batch_size):
+        super().__init__('likes-buffer', flush_interval)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.pending = {}
+        self.deltas = Counter()
+        # записи, которые прямо сейчас пишутся в базу
+        self.flushing = {}
+        self.flushing_deltas = Counter()
+
+    def get_buffered_state(self, post_id, user_id):
+        key = (post_id, user_id)
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+            return self.flushing.get(key)
+
+    def is_liked(self, post_id, user_id):
+        liked = self.get_buffered_state(post_id, user_id)
+        if liked is None:
+            liked = Post.likes.through.objects.filter(
+                post_id=post_id, user_id=user_id).exists()
+        return liked
+
+    def set_liked(self, post_id, user_id, liked):
+        """Запоминает лайк или его снятие и отдаёт изменение счётчика."""
+        was_liked = self.is_liked(post_id, user_id)
+        key = (post_id, user_id)
+        with self.lock:
+            # пока шёл запрос в базу, параллельный запрос мог обновить буфер
+            if key in self.pending:
+                was_liked = self.pending[key]
+            elif key in self.flushing:
+                was_liked = self.flushing[key]
+            self.pending[key] = liked
+            delta = int(liked) - int(was_liked)
+            self.deltas[post_id] += delta
+            overflow = len(self.pending) >= self.max_size
+        self.ensure_started()
+        if overflow:
+            self.wakeup.set()
+        return delta
+
+    def get_pending_delta(self, post_id):
+        with self.lock:
+            return self.deltas[post_id] + self.flushing_deltas[post_id]
+
+    def write_pending(self):
+        with self.lock:
+            if not self.pending:
+                return
+            self.flushing, self.pending = self.pending, {}
+            self.flushing_deltas, self.deltas = self.deltas, Counter()
+        try:
+            changed_posts_ids = write_likes(self.flushing, self.batch_size)
+        except Exception:
+            logger.exception(
+                'Не удалось записать %s лайков', len(self.flushing))
+            with self.lock:
+                for key, liked in self.flushing.items():
+                    self.pending.setdefault(key, liked)
+                self.deltas.update(self.flushing_deltas)
+        else:
+            bump_likes_versions(changed_posts_ids)
+        finally:
+            with self.lock:
+                self.flushing = {}
+                self.flushing_deltas = Counter()
+
+
+likes_buffer = LikesBuffer(
+    flush_interval=settings.LIKES_FLUSH_INTERVAL,
+    max_size=settings.LIKES_BUFFER_MAX_SIZE,
+    batch_size=settings.LIKES_FLUSH_BATCH_SIZE,
+)
@@ -0,0 +1,111 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Avatar, Post
+from blog.page_cache import FEED_SCOPE, SIDEBAR_SCOPE, bump_versions
+from blog.renditions import (
+    build_avatar_renditions, build_post_renditions, get_rendition_formats)
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит уменьшенные копии картинок постов и аватаров, '
+        'загруженных до появления конвейера картинок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов обрабатывают картинки параллельно',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересобрать копии и для картинок, у которых они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            self.backfill_posts(pool, options['force'])
+            self.backfill_avatars(pool, options['force'])
+        bump_versions(FEED_SCOPE, SIDEBAR_SCOPE)
+
+    def iterate_batches(self, queryset):
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id).order_by('id')[
+                :self.batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def backfill_posts(self, pool, force):
+        posts = Post.objects.exclude(image='').only('id', 'image')
+        if not force:
+            posts = posts.filter(image_hash='')
+        formats = get_rendition_formats()
+
+        done = 0
+        for batch in self.iterate_batches(posts):
+            futures = {
+                post: pool.submit(
+                    build_post_renditions,
+                    post.image.path,
+                    settings.MEDIA_ROOT,
+                    formats,
+                )
+                for post in batch
+            }
+            processed = []
+            for post, future in futures.items():
+                try:
+                    post.image_hash = future.result()
+                except OSError as error:
+                    self.stderr.write(f'Пост {post.id}: {error}')
+                    continue
+                processed.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(processed, ['image_hash'])
+            done += len(processed)
+            self.stdout.write(f'Картинок постов обработано: {done}')
+
+    def backfill_avatars(self, pool, force):
+        avatars = Avatar.objects.exclude(original_image='')
+        if not force:
+            avatars = avatars.filter(profile_image='')
+
+        done = 0
+        for batch in self.iterate_batches(avatars):
+            futures = {
+                avatar: pool.submit(
+                    build_avatar_renditions,
+                    avatar.original_image.path,
+                    settings.MEDIA_ROOT,
+                    'webp',
+                )
+                for avatar in batch
+            }
+            processed = []
+            for avatar, future in futures.items():
+                try:
+                    names = future.result()
+                except OSError as error:
+                    self.stderr.write(f'Аватар {avatar.id}: {error}')
+                    continue
+                avatar.profile_image = names['profile_image']
+                avatar.comment_image = names['comment_image']
+                processed.append(avatar)
+            with transaction.atomic():
+                Avatar.objects.bulk_update(
+                    processed, ['profile_image', 'comment_image'])
+            done += len(processed)
+            self.stdout.write(f'Аватаров обработано: {done}')
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+
+from blog.management.commands.bench_views import (
+    DUMMY_CACHES, get_bench_urls, get_percentile)
+
+
+ASGI_URLCONF = 'sensive_blog.asgi_urls'
+WSGI_URLCONF = 'sensive_blog.urls'
+
+
+def make_environ(url):
+    parts = urlsplit(url)
+    environ = {
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_HOST': 'testserver',
+    }
+    setup_testing_defaults(environ)
+    return environ
+
+
+def make_scope(url):
+    parts = urlsplit(url)
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность и хвост задержек WSGI и ASGI '
+        'при множестве одновременных соединений с медленными клиентами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=100,
+            help='Сколько клиентов одновременно ждут ответа',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Сколько запросов сделать в каждом режиме',
+        )
+        parser.add_argument(
+            '--wsgi-workers',
+            type=int,
+            default=8,
+            help='Сколько потоков обслуживают WSGI, как у gunicorn',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=20,
+            help='Сколько миллисекунд клиент читает каждый ответ',
+        )
+        parser.add_argument(
+            '--output',
+            default='bench_asgi_report.json',
+            help='Куда записать отчёт',
+        )
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help='Не отключать кэш страниц и фрагментов',
+        )
+
+    def handle(self, *args, **options):
+        self.connections = options['connections']
+        self.requests_amount = options['requests']
+        self.client_delay = options['client_delay'] / 1000
+        urls = [
+            url
+            for view_urls in get_bench_urls().values()
+            for url in view_urls
+        ]
+
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['with_cache']:
+            overrides['CACHES'] = DUMMY_CACHES
+
+        with override_settings(ROOT_URLCONF=WSGI_URLCONF, **overrides):
+            wsgi_stats = self.bench_wsgi(urls, options['wsgi_workers'])
+        with override_settings(ROOT_URLCONF=ASGI_URLCONF, **overrides):
+            asgi_stats = asyncio.run(self.bench_asgi(urls))
+
+        report = {
+            'connections': self.connections,
+            'client_delay_ms': options['client_delay'],
+            'wsgi_workers': options['wsgi_workers'],
+            'with_cache': options['with_cache'],
+            'modes': {'wsgi': wsgi_stats, 'asgi': asgi_stats},
+        }
+        with open(options['output'], 'w') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+        self.print_report(report)
+
+    def bench_wsgi(self, urls, workers):
+        """Клиенты-потоки отправляют запросы в пул из `workers` потоков.
+
+        Пока клиент медленно читает ответ, поток пула занят и не берёт
+        следующий запрос — так ведёт себя синхронный воркер за прокси
+        без буферизации.
+        """
+        application = get_wsgi_application()
+        counter = iter(range(self.requests_amount))
+        counter_lock = threading.Lock()
+        latencies = []
+        errors = []
+
+        def serve(url):
+            statuses = []
+
+            def start_response(status, headers, exc_info=None):
+                statuses.append(int(status.split()[0]))
+
+            body = application(make_environ(url), start_response)
+            try:
+                for _chunk in body:
+                    time.sleep(self.client_delay)
+            finally:
+                body.close()
+            return statuses[0]
+
+        def run_client(pool):
+            while True:
+                with counter_lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                url = urls[number % len(urls)]
+                started_at = time.perf_counter()
+                status = pool.submit(serve, url).result()
+                latencies.append(time.perf_counter() - started_at)
+                if status != 200:
+                    errors.append(f'{url}: {status}')
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            clients = [
+                threading.Thread(target=run_client, args=[pool])
+                for _ in range(self.connections)
+            ]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        return self.get_stats(
+            latencies, errors, time.perf_counter() - started_at)
+
+    async def bench_asgi(self, urls):
+        application = get_asgi_application()
+        counter = iter(range(self.requests_amount))
+        latencies = []
+        errors = []
+
+        async def serve(url):
+            statuses = []
+            finished = asyncio.Event()
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b''}
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif message['type'] == 'http.response.body':
+                    await asyncio.sleep(self.client_delay)
+
+            try:
+                await application(make_scope(url), receive, send)
+            finally:
+                finished.set()
+            return statuses[0]
+
+        async def run_client():
+            for number in counter:
+                url = urls[number % len(urls)]
+                started_at = time.perf_counter()
+                status = await serve(url)
+                latencies.append(time.perf_counter() - started_at)
+                if status != 200:
+                    errors.append(f'{url}: {status}')
+
+        started_at = time.perf_counter()
+        await asyncio.gather(
+            *(run_client() for _ in range(self.connections)))
+        return self.get_stats(
+            latencies, errors, time.perf_counter() - started_at)
+
+    def get_stats(self, latencies, errors, seconds):
+        if errors:
+            raise CommandError(f'Ошибки при замерах: {errors[:5]}')
+        latencies_ms = [latency * 1000 for latency in latencies]
+        return {
+            'requests': len(latencies),
+            'seconds': round(seconds, 2),
+            'requests_per_second': round(len(latencies) / seconds, 1),
+            'latency_ms_p50': get_percentile(latencies_ms, 50),
+            'latency_ms_p95': get_percentile(latencies_ms, 95),
+            'latency_ms_p99': get_percentile(latencies_ms, 99),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"режим":<6} {"запр/с":>8} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"p99, мс":>9}'
+        )
+        for mode, stats in report['modes'].items():
+            self.stdout.write(
+                f'{mode:<6} {stats["requests_per_second"]:>8.1f} '
+                f'{stats["latency_ms_p50"]:>9.1f} '
+                f'{stats["latency_ms_p95"]:>9.1f} '
+                f'{stats["latency_ms_p99"]:>9.1f}'
+            )
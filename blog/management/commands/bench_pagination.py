@@ -0,0 +1,100 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import Post, Tag
+from blog.pagination import (
+    POSTS_PER_PAGE, TAG_POSTS_PER_PAGE, encode_cursor, paginate_by_keyset,
+    paginate_tag_posts)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выборки страницы ленты и страницы самого '
+        'популярного тега через курсор и через OFFSET на разной глубине. '
+        'Для тега отдельно меряется старый курсор с JOIN постов и тегов. '
+        'Запускайте на базе, заполненной командой seed_blog.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            nargs='+',
+            default=[1, 10, 100, 1000, 10000, 100000],
+            help='Номера страниц, на которых мерить время',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз повторять каждый замер',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('-published_at', '-id')
+        total = posts.count()
+        if not total:
+            raise CommandError('В базе нет постов')
+
+        self.stdout.write(f'Постов в базе: {total}')
+        self.bench(
+            posts,
+            POSTS_PER_PAGE,
+            {
+                'курсор': lambda cursor, page: paginate_by_keyset(
+                    Post.objects.all(), after=cursor),
+                'OFFSET': lambda cursor, page: paginate_by_keyset(
+                    Post.objects.all(), page=page),
+            },
+            options,
+        )
+
+        tag = Tag.objects.popular().first()
+        tag_posts = tag.posts.order_by('-published_at', '-id')
+        self.stdout.write(
+            f'\nТег «{tag.title}», постов: {tag_posts.count()}')
+        self.bench(
+            tag_posts,
+            TAG_POSTS_PER_PAGE,
+            {
+                'курсор': lambda cursor, page: paginate_tag_posts(
+                    Post.objects.all(), tag.id, after=cursor),
+                'JOIN': lambda cursor, page: paginate_by_keyset(
+                    tag.posts.all(), after=cursor,
+                    per_page=TAG_POSTS_PER_PAGE),
+                'OFFSET': lambda cursor, page: paginate_tag_posts(
+                    Post.objects.all(), tag.id, page=page),
+            },
+            options,
+        )
+
+    def bench(self, posts, per_page, get_page_by_name, options):
+        """Печатает медианы `get_page(cursor, page)` для каждой страницы."""
+        total = posts.count()
+        repeat = options['repeat']
+        header = ''.join(f'{name + ", мс":>14}' for name in get_page_by_name)
+        self.stdout.write(f'{"страница":>10}{header}')
+        for page in options['pages']:
+            offset = (page - 1) * per_page
+            if offset >= total:
+                break
+            cursor = None
+            if offset:
+                last_post = posts.only('id', 'published_at')[offset - 1]
+                cursor = encode_cursor(last_post)
+
+            timings = ''.join(
+                f'{self.measure(get_page, cursor, page, repeat):>14.3f}'
+                for get_page in get_page_by_name.values()
+            )
+            self.stdout.write(f'{page:>10}{timings}')
+
+    def measure(self, get_page, cursor, page, repeat):
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            get_page(cursor, page)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,220 @@
+import json
+import math
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from blog.instrumentation import collect_stats
+from blog.models import Post, Tag
+from blog.pagination import encode_cursor
+from blog.sidebar import get_cache_stats
+
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def get_percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, math.ceil(len(ordered) * percent / 100) - 1)
+    return ordered[index]
+
+
+def get_bench_urls():
+    """Адреса для замеров: первая и сотая страница ленты, самые
+    комментируемые и случайные посты, популярные теги."""
+    posts = Post.objects.order_by('-published_at', '-id')
+    if not posts.exists():
+        raise CommandError(
+            'В базе нет постов, заполните её командой seed_blog')
+
+    # последний пост сотой страницы ленты, либо самый старый пост
+    deep_posts = list(posts.only('id', 'published_at')[499:500])
+    deep_post = deep_posts[0] if deep_posts else posts.last()
+    most_commented = Post.objects.order_by(
+        '-comments_count').values_list('slug', flat=True)[:5]
+    random_posts = Post.objects.order_by('?').values_list(
+        'slug', flat=True)[:5]
+    popular_tags = Tag.objects.popular().values_list(
+        'slug', flat=True)[:5]
+    return {
+        'index': [
+            reverse('index'),
+            f"{reverse('index', args=[100])}"
+            f'?after={encode_cursor(deep_post)}',
+        ],
+        'post_detail': [
+            reverse('post_detail', args=[slug])
+            for slug in [*most_commented, *random_posts]
+        ],
+        'tag_filter': [
+            reverse('tag_filter', args=[slug])
+            for slug in popular_tags
+        ],
+    }
+
+
+def measure_peak_memory(client, url):
+    """Пиковый прирост памяти Python за один запрос, в килобайтах.
+
+    Сюда входят строки, прочитанные из базы, поэтому лишние колонки
+    вроде полного текста постов сразу видны. Замер идёт отдельным
+    запросом: tracemalloc замедляет всё остальное.
+    """
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет index, post_detail и tag_filter через тестовый клиент '
+        'и пишет в JSON число запросов, время SQL, рендера и перцентили '
+        'времени ответа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Сколько запросов делать к каждому view',
+        )
+        parser.add_argument(
+            '--output',
+            default='bench_report.json',
+            help='Куда записать отчёт',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Отчёт прошлого запуска, с которым сравнить результаты',
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Подпись запуска, например хэш коммита',
+        )
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help='Не отключать кэш страниц и фрагментов',
+        )
+
+    def handle(self, *args, **options):
+        urls_by_view = get_bench_urls()
+
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['with_cache']:
+            overrides['CACHES'] = DUMMY_CACHES
+
+        with override_settings(**overrides):
+            views_stats = {
+                view_name: self.benchmark(urls, options['requests'])
+                for view_name, urls in urls_by_view.items()
+            }
+
+        report = {
+            'label': options['label'],
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'with_cache': options['with_cache'],
+            'dataset': {
+                'posts': Post.objects.count(),
+                'tags': Tag.objects.count(),
+            },
+            'views': views_stats,
+            # счётчики живут в процессе, и в них только запросы замера
+            'sidebar_cache': get_cache_stats(),
+        }
+        with open(options['output'], 'w') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                self.print_comparison(json.load(previous_file), report)
+
+    def benchmark(self, urls, requests_amount):
+        client = Client()
+        samples = []
+        for number in range(requests_amount):
+            url = urls[number % len(urls)]
+            with collect_stats() as stats:
+                started_at = time.perf_counter()
+                response = client.get(url)
+                latency = time.perf_counter() - started_at
+            if response.status_code != 200:
+                raise CommandError(f'{url} ответил {response.status_code}')
+            samples.append({
+                'latency_ms': latency * 1000,
+                'sql_ms': stats.sql_seconds * 1000,
+                'render_ms': stats.render_seconds * 1000,
+                'queries': stats.queries_count,
+                'bytes': len(response.content),
+            })
+
+        memory_kb = [measure_peak_memory(client, url) for url in urls]
+
+        def column(name):
+            return [sample[name] for sample in samples]
+
+        return {
+            'urls': urls,
+            'requests': len(samples),
+            'queries_max': max(column('queries')),
+            'sql_ms_p50': get_percentile(column('sql_ms'), 50),
+            'render_ms_p50': get_percentile(column('render_ms'), 50),
+            'latency_ms_p50': get_percentile(column('latency_ms'), 50),
+            'latency_ms_p95': get_percentile(column('latency_ms'), 95),
+            'bytes_max': max(column('bytes')),
+            'memory_kb_max': max(memory_kb),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"view":<12} {"запросов":>9} {"SQL p50":>9} {"рендер p50":>11} '
+            f'{"p50, мс":>9} {"p95, мс":>9} {"память, КБ":>11}'
+        )
+        for view_name, stats in report['views'].items():
+            self.stdout.write(
+                f'{view_name:<12} {stats["queries_max"]:>9} '
+                f'{stats["sql_ms_p50"]:>9.2f} {stats["render_ms_p50"]:>11.2f} '
+                f'{stats["latency_ms_p50"]:>9.2f} '
+                f'{stats["latency_ms_p95"]:>9.2f} '
+                f'{stats.get("memory_kb_max", 0):>11.0f}'
+            )
+        sidebar_cache = report['sidebar_cache']
+        hit_ratio = sidebar_cache['hit_ratio'] or 0
+        self.stdout.write(
+            f'\nКэш сайдбара: попаданий {sidebar_cache["hits"]}, '
+            f'промахов {sidebar_cache["misses"]}, доля {hit_ratio:.0%}'
+        )
+
+    def print_comparison(self, previous, current):
+        self.stdout.write(f'\nСравнение с «{previous.get("label", "")}»:')
+        for view_name, stats in current['views'].items():
+            old_stats = previous['views'].get(view_name)
+            if not old_stats:
+                continue
+            queries_delta = stats['queries_max'] - old_stats['queries_max']
+            latency_ratio = (
+                stats['latency_ms_p95'] / old_stats['latency_ms_p95'])
+            line = (
+                f'{view_name:<12} запросов {queries_delta:+d}, '
+                f'p95 x{latency_ratio:.2f}'
+            )
+            if old_stats.get('memory_kb_max'):
+                memory_ratio = (
+                    stats['memory_kb_max'] / old_stats['memory_kb_max'])
+                line += f', память x{memory_ratio:.2f}'
+            if queries_delta > 0 or latency_ratio > 1.2:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
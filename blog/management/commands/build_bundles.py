@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.bundles import write_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        'Склеивает и минифицирует CSS и JS из STATIC_BUNDLES. '
+        'Запускайте перед collectstatic'
+    )
+
+    def handle(self, *args, **options):
+        for name in settings.STATIC_BUNDLES:
+            if write_bundle(name):
+                self.stdout.write(f'{name}: собран')
+            else:
+                self.stdout.write(f'{name}: без изменений')
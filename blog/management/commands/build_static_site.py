@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog.static_site import (
+    collect_pages, read_manifest, remove_stale_files, render_pages,
+    write_manifest)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает главную, посты, теги и контакты в статичные HTML-файлы. '
+        'Повторный запуск рендерит только изменившиеся страницы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.STATIC_SITE_DIR,
+            help='Куда сложить файлы сайта',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов рендерят страницы параллельно',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько страниц отдавать процессу за раз',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Отрендерить все страницы, не глядя на прошлую сборку',
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output']
+        batch_size = options['batch_size']
+        manifest = {} if options['full'] else read_manifest(output_dir)
+
+        pages = list(collect_pages())
+        changed_pages = [
+            (page.url, page.filename)
+            for page in pages
+            if manifest.get(page.filename) != page.fingerprint
+            or not os.path.exists(os.path.join(output_dir, page.filename))
+        ]
+        self.stdout.write(
+            f'Страниц всего: {len(pages)}, к рендеру: {len(changed_pages)}')
+
+        # дочерние процессы не должны делить соединения с родителем
+        connections.close_all()
+        rendered = 0
+        with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=django.setup) as pool:
+            futures = [
+                pool.submit(
+                    render_pages,
+                    changed_pages[start:start + batch_size],
+                    output_dir,
+                )
+                for start in range(0, len(changed_pages), batch_size)
+            ]
+            for future in as_completed(futures):
+                rendered += future.result()
+                self.stdout.write(f'Отрендерено страниц: {rendered}')
+
+        fingerprints = {page.filename: page.fingerprint for page in pages}
+        remove_stale_files(output_dir, set(manifest) - set(fingerprints))
+        write_manifest(output_dir, fingerprints)
+        self.stdout.write(f'Сайт выгружен в {output_dir}')
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from blog.db import read_from_replica
+from blog.models import Comment, Post
+from blog.pagination import paginate_by_keyset
+
+
+DELETE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает базу параллельными читателями и писателями и считает '
+        'операции в секунду. Сравнивайте результаты с разными настройками '
+        'SQLITE_* и DATABASE_CONN_MAX_AGE. Писатели добавляют настоящие '
+        'комментарии, которые в конце удаляются, поэтому без --yes команда '
+        'запускается только с DEBUG.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность теста в секундах',
+        )
+        parser.add_argument(
+            '--yes',
+            action='store_true',
+            help='Запустить, даже если DEBUG выключен',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['yes']:
+            raise CommandError(
+                'Тест пишет комментарии в настроенную базу. Запустите его '
+                'с DEBUG или подтвердите флагом --yes'
+            )
+        posts_ids = list(Post.objects.values_list('id', flat=True)[:1000])
+        users_ids = list(User.objects.values_list('id', flat=True)[:1000])
+        if not posts_ids or not users_ids:
+            raise CommandError('Нужны посты и пользователи в базе')
+
+        created_ids = []
+        stats = Counter()
+        stats_lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def run(operation):
+            while time.monotonic() < deadline:
+                try:
+                    operation()
+                    result = f'{operation.__name__}_ok'
+                except OperationalError:
+                    result = f'{operation.__name__}_errors'
+                finally:
+                    # как после обработки запроса: соединение закроется,
+                    # только если истёк DATABASE_CONN_MAX_AGE
+                    close_old_connections()
+                with stats_lock:
+                    stats[result] += 1
+
+        def read():
+            with read_from_replica():
+                list(Post.objects.popular().prefetch_tags_with_counts()[:5])
+                paginate_by_keyset(Post.objects.prefetch_tags_with_counts())
+
+        def write():
+            with transaction.atomic():
+                comment = Comment.objects.create(
+                    post_id=random.choice(posts_ids),
+                    author_id=random.choice(users_ids),
+                    text='Комментарий из нагрузочного теста',
+                    published_at=timezone.now(),
+                )
+            created_ids.append(comment.id)
+
+        threads = [
+            threading.Thread(target=run, args=[read])
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=run, args=[write])
+            for _ in range(options['writers'])
+        ]
+        started_at = time.monotonic()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.monotonic() - started_at
+            self.delete_comments(created_ids)
+
+        for operation in ('read', 'write'):
+            done = stats[f'{operation}_ok']
+            self.stdout.write(
+                f'{operation}: {done / elapsed:.1f} оп/с, '
+                f'ошибок блокировки: {stats[f"{operation}_errors"]}'
+            )
+
+    def delete_comments(self, comments_ids):
+        """Удаляет комментарии теста.
+
+        Удаление идёт через ORM, и сигналы возвращают счётчики
+        комментариев, кэш страниц и поисковый индекс к прежнему виду.
+        """
+        for start in range(0, len(comments_ids), DELETE_BATCH_SIZE):
+            batch = comments_ids[start:start + DELETE_BATCH_SIZE]
+            Comment.objects.filter(pk__in=batch).delete()
+        self.stdout.write(f'Удалено комментариев теста: {len(comments_ids)}')
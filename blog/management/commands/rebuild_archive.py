@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.archive import rebuild_archive_months
+from blog.page_cache import SIDEBAR_SCOPE, bump_versions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число постов по месяцам для архива'
+
+    def handle(self, *args, **options):
+        months_count = rebuild_archive_months()
+        bump_versions(SIDEBAR_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, месяцев с постами: {months_count}'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.page_cache import RELATED_SCOPE, bump_versions
+from blog.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Заново считает похожие посты для блока «Читайте также»'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Для скольких постов считать похожие за один проход',
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        written = rebuild_related_posts(options['batch_size'])
+        bump_versions(RELATED_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано {written} пар похожих постов '
+            f'за {time.monotonic() - started_at:.1f} с'))
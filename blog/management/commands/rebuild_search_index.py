@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс постов и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов переиндексировать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в поисковом индексе: {indexed}'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики лайков и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов обновлять за один UPDATE',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            batch_ids = list(
+                Post.objects
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch_ids:
+                break
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    id__in=batch_ids).recount_counters()
+            last_id = batch_ids[-1]
+            self.stdout.write(f'Пересчитано постов: {updated}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, пересчитано постов: {updated}'))
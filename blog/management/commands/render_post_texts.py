@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog.models import Post
+from blog.page_cache import (
+    FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE, bump_versions,
+    get_post_scope)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет анонсы и HTML текста постов, сохранённых до миграции'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов читать и обновлять за раз',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перерисовать все посты, а не только незаполненные',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.order_by('id').only('id', 'slug', 'text')
+        if not options['all']:
+            posts = posts.filter(text_html='')
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                post.render_text()
+            # посты меняются мимо save(), чтобы не пересчитывать рейтинг,
+            # поиск и похожие посты из-за того, что текст не поменялся
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'UPDATE {Post._meta.db_table} '
+                    f'SET teaser = %s, text_html = %s WHERE id = %s',
+                    [
+                        (post.teaser, post.text_html, post.id)
+                        for post in batch
+                    ],
+                )
+            bump_versions(*(get_post_scope(post.slug) for post in batch))
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Обработано постов: {updated}')
+        if updated:
+            bump_versions(FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, обработано постов: {updated}'))
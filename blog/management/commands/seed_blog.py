@@ -0,0 +1,238 @@
+import itertools
+import random
+from array import array
+import secrets
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog.archive import rebuild_archive_months
+from blog.models import Comment, Post, PostTag, Tag
+from blog.page_cache import (
+    FEED_SCOPE, RELATED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE,
+    bump_versions)
+from blog.related import rebuild_related_posts
+from blog.search import rebuild_search_index
+from blog.sidebar import invalidate_popular_tags
+from blog.trending import update_trending_scores
+
+
+LOREM_WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua ut enim ad minim '
+    'veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea '
+    'commodo consequat duis aute irure in reprehenderit voluptate velit esse '
+    'cillum fugiat nulla pariatur excepteur sint occaecat cupidatat non '
+    'proident sunt culpa qui officia deserunt mollit anim id est laborum'
+).split()
+
+
+def make_text(words_amount):
+    return ' '.join(random.choices(LOREM_WORDS, k=words_amount))
+
+
+def make_post(**fields):
+    # bulk_create не шлёт pre_save, поэтому анонс готовится здесь
+    post = Post(**fields)
+    post.render_text()
+    return post
+
+
+def make_zipf_weights(amount, exponent):
+    """Кумулятивные веса распределения Ципфа для `random.choices`.
+
+    Первый элемент выбирается чаще всех, второй — в 2^s раз реже и так
+    далее: так распределены лайки и комментарии у настоящих постов.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, amount + 1)))
+
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу тестовыми пользователями, постами, тегами, '
+        'комментариями и лайками с неравномерной популярностью'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--likes', type=int, default=100000)
+        parser.add_argument(
+            '--max-tags-per-post',
+            type=int,
+            default=5,
+        )
+        parser.add_argument(
+            '--zipf-exponent',
+            type=float,
+            default=1.1,
+            help='Чем больше, тем сильнее популярность сосредоточена '
+                 'в немногих постах и тегах',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Зерно генератора случайных чисел для воспроизводимости',
+        )
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        self.exponent = options['zipf_exponent']
+        # метка запуска, чтобы повторный запуск не конфликтовал по slug
+        self.run_label = secrets.token_hex(3)
+        self.now = timezone.now()
+
+        started_at = time.monotonic()
+        users_ids = self.create_users(options['users'])
+        tags_ids = self.create_tags(options['tags'])
+        posts_ids, posts_ages = self.create_posts(
+            options['posts'], users_ids)
+        self.create_posts_tags(
+            posts_ids, tags_ids, options['max_tags_per_post'])
+        self.create_comments(
+            options['comments'], posts_ids, posts_ages, users_ids)
+        self.create_likes(options['likes'], posts_ids, users_ids)
+        self.recount_counters(posts_ids)
+        # bulk_create не вызывает сигналы, которые ведут поисковый индекс
+        rebuild_search_index(self.batch_size)
+        self.stdout.write('Поисковый индекс перестроен')
+        update_trending_scores(self.batch_size)
+        self.stdout.write('Рейтинг популярных постов пересчитан')
+        rebuild_related_posts(self.batch_size)
+        self.stdout.write('Похожие посты посчитаны')
+        rebuild_archive_months()
+        self.stdout.write('Архив по месяцам пересчитан')
+
+        invalidate_popular_tags()
+        bump_versions(
+            FEED_SCOPE, SIDEBAR_SCOPE, RELATED_SCOPE, SYNDICATION_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started_at:.1f} с'))
+
+    def bulk_create(self, model, objects, **kwargs):
+        # с ignore_conflicts pk не проставляются, и отброшенные базой
+        # строки не отличить от записанных, поэтому их считает база
+        rows_before = model.objects.count()
+        created_ids = []
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch, **kwargs)
+            created_ids.extend(obj.pk for obj in created)
+        created_amount = model.objects.count() - rows_before
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {created_amount}')
+        return created_ids
+
+    def create_users(self, amount):
+        users = (
+            User(
+                username=f'user-{self.run_label}-{number}',
+                # пароль непригоден для входа, как у set_unusable_password
+                password='!',
+                is_staff=number % 10 == 0,
+            )
+            for number in range(amount)
+        )
+        return self.bulk_create(User, users)
+
+    def create_tags(self, amount):
+        tags = (
+            Tag(
+                title=f'{self.run_label}-{number}',
+                slug=f'{self.run_label}-{number}',
+            )
+            for number in range(amount)
+        )
+        return self.bulk_create(Tag, tags)
+
+    def create_posts(self, amount, users_ids):
+        """Создаёт посты и отдаёт их id и возраст в секундах.
+
+        Возраст нужен комментариям, чтобы они не были старше поста.
+        """
+        authors_ids = users_ids[::10] or users_ids
+        posts_ages = array('q', (
+            random.randint(0, 5 * 365 * 24 * 60 * 60) for _ in range(amount)))
+        posts = (
+            make_post(
+                title=f'Пост {number}',
+                text=make_text(random.randint(50, 400)),
+                slug=f'post-{self.run_label}-{number}',
+                image='',
+                published_at=self.now - timedelta(seconds=posts_ages[number]),
+                author_id=random.choice(authors_ids),
+            )
+            for number in range(amount)
+        )
+        return self.bulk_create(Post, posts), posts_ages
+
+    def create_posts_tags(self, posts_ids, tags_ids, max_tags_per_post):
+        weights = make_zipf_weights(len(tags_ids), self.exponent)
+        posts_tags = (
+            PostTag(post_id=post_id, tag_id=tag_id)
+            for post_id in posts_ids
+            for tag_id in set(random.choices(
+                tags_ids,
+                cum_weights=weights,
+                k=random.randint(1, max_tags_per_post),
+            ))
+        )
+        self.bulk_create(PostTag, posts_tags)
+        PostTag.objects.filter(published_at__isnull=True).fill_published_at()
+
+    def pick_popular_posts(self, posts_ids, amount):
+        # популярность не должна совпадать с порядком создания постов
+        shuffled_ids = random.sample(posts_ids, len(posts_ids))
+        weights = make_zipf_weights(len(shuffled_ids), self.exponent)
+        for batch_start in range(0, amount, self.batch_size):
+            batch_amount = min(self.batch_size, amount - batch_start)
+            yield from random.choices(
+                shuffled_ids, cum_weights=weights, k=batch_amount)
+
+    def create_comments(self, amount, posts_ids, posts_ages, users_ids):
+        # комментарий пишется не раньше поста и не позже чем через год
+        comments = (
+            Comment(
+                post_id=posts_ids[index],
+                author_id=random.choice(users_ids),
+                text=make_text(random.randint(5, 60)),
+                published_at=self.now - timedelta(seconds=random.randint(
+                    max(0, posts_ages[index] - 365 * 24 * 60 * 60),
+                    posts_ages[index],
+                )),
+            )
+            for index in self.pick_popular_posts(
+                range(len(posts_ids)), amount)
+        )
+        self.bulk_create(Comment, comments)
+
+    def create_likes(self, amount, posts_ids, users_ids):
+        likes = (
+            Post.likes.through(
+                post_id=post_id, user_id=random.choice(users_ids))
+            for post_id in self.pick_popular_posts(posts_ids, amount)
+        )
+        # повторные пары пост-пользователь отбрасываются базой
+        self.bulk_create(Post.likes.through, likes, ignore_conflicts=True)
+
+    def recount_counters(self, posts_ids):
+        for batch in batched(posts_ids, self.batch_size):
+            with transaction.atomic():
+                Post.objects.filter(id__in=batch).recount_counters()
+        self.stdout.write('Счётчики лайков и комментариев пересчитаны')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных постов у тех постов, чьи лайки, '
+        'комментарии или просмотры изменились с прошлого запуска'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов пересчитать в одной транзакции',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать все посты, например после смены весов',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Post.objects.update(trending_stale=True)
+        updated_count = update_trending_scores(options['batch_size'])
+        self.stdout.write(f'Рейтинг пересчитан у {updated_count} постов')
@@ -0,0 +1,196 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from blog.hits import hit_counter
+from blog.instrumentation import collect_stats, current_stats
+
+
+logger = logging.getLogger('blog.instrumentation')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """Задаёт view собственный лимит запросов вместо `QUERY_BUDGET`."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryInstrumentationMiddleware:
+    """Считает запросы к базе и время ответа для части запросов.
+
+    Включается настройкой `QUERY_INSTRUMENTATION`. Для доли запросов
+    `QUERY_INSTRUMENTATION_SAMPLE_RATE` пишет в лог число запросов, время
+    SQL и рендера, выставляет заголовок `Server-Timing` и предупреждает
+    о повторяющихся запросах — признаке N+1. В строгом режиме замеряется
+    каждый запрос, а превышение лимита запросов роняет view с ошибкой.
+    В лимит идут только запросы самой view: сессия и пользователь
+    загружаются до её вызова, в `process_view`.
+    Middleware синхронное: под ASGI оно переводит view в синхронный режим,
+    поэтому замеры стоит снимать на WSGI.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        strict = settings.QUERY_INSTRUMENTATION_STRICT
+        sample_rate = settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+        if not strict and random.random() >= sample_rate:
+            return self.get_response(request)
+
+        request.query_budget = settings.QUERY_BUDGET
+        started_at = time.perf_counter()
+        with collect_stats() as stats:
+            response = self.get_response(request)
+        total_seconds = time.perf_counter() - started_at
+
+        repeated_queries = stats.get_repeated_queries(
+            settings.N_PLUS_ONE_THRESHOLD)
+        response['Server-Timing'] = ', '.join([
+            f'db;desc="{stats.queries_count} queries";'
+            f'dur={stats.sql_seconds * 1000:.1f}',
+            f'render;dur={stats.render_seconds * 1000:.1f}',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ])
+        log_record = {
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries_count,
+            'view_queries': stats.view_queries_count,
+            'authenticated': stats.user_authenticated,
+            'db_ms': round(stats.sql_seconds * 1000, 2),
+            'render_ms': round(stats.render_seconds * 1000, 2),
+            'total_ms': round(total_seconds * 1000, 2),
+        }
+        logger.info(json.dumps(log_record))
+        for repeated_query in repeated_queries:
+            logger.warning(json.dumps({
+                'path': request.path,
+                'n_plus_one': repeated_query,
+            }))
+
+        if strict and stats.view_queries_count > request.query_budget:
+            raise QueryBudgetExceeded(
+                f'{request.path}: {stats.view_queries_count} запросов к базе '
+                f'при лимите {request.query_budget}, повторяющиеся '
+                f'запросы: {repeated_queries}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats.get()
+        if stats is None:
+            return
+        if hasattr(request, 'user'):
+            # сессия и пользователь грузятся лениво, обычно уже внутри
+            # view, а их запросы не должны расходовать её лимит
+            stats.user_authenticated = request.user.is_authenticated
+        stats.start_view()
+        request.query_budget = getattr(
+            view_func, 'query_budget', settings.QUERY_BUDGET)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, который умеет работать в асинхронном стеке middleware.
+
+    Синхронное middleware под ASGI заставляет Django выполнять всё, что
+    ниже него, через `async_to_sync` в отдельном потоке, и асинхронные
+    view теряют смысл. Под ASGI файл читается в потоке целиком — так же
+    Django обошёлся бы с синхронным `FileResponse`, только без
+    предупреждения.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(
+                request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        return await sync_to_async(
+            self.serve_in_memory, thread_sensitive=False)(static_file, request)
+
+    @staticmethod
+    def serve_in_memory(static_file, request):
+        response = static_file.get_response(request.method, request.META)
+        content = b''
+        if response.file is not None:
+            with response.file:
+                content = response.file.read()
+        http_response = HttpResponse(content, status=int(response.status))
+        del http_response['Content-Type']
+        for key, value in response.headers:
+            http_response[key] = value
+        return http_response
+
+
+class PageViewMiddleware:
+    """Считает просмотры страниц блога из `PAGE_VIEWS_URL_NAMES`.
+
+    Просмотром считается успешный GET и ответ 304 из кэша страниц.
+    Счётчик живёт в памяти процесса, поэтому запрос не ждёт базу.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.record(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.record(request, response)
+        return response
+
+    @staticmethod
+    def record(request, response):
+        match = request.resolver_match
+        if request.method != 'GET' or response.status_code not in (200, 304):
+            return
+        if not match or match.url_name not in settings.PAGE_VIEWS_URL_NAMES:
+            return
+        post_slug = ''
+        if match.url_name == 'post_detail':
+            post_slug = match.kwargs['slug']
+        hit_counter.record(request.path[:200], post_slug)
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    likes = (
+        Post.likes.through.objects
+        .filter(post_id=OuterRef('pk'))
+        .order_by()
+        .values('post_id')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    comments = (
+        Comment.objects
+        .filter(post_id=OuterRef('pk'))
+        .order_by()
+        .values('post_id')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    Post.objects.update(
+        likes_count=Coalesce(Subquery(likes), 0),
+        comments_count=Coalesce(Subquery(comments), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_comment_post_related_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Число комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name='Число лайков'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-likes_count'], name='post_likes_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
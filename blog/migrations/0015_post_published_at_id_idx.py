@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_post_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-published_at', '-id'],
+                name='post_published_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_comment_post_published_at_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_hash',
+            field=models.CharField(
+                blank=True, editable=False, max_length=32,
+                verbose_name='Хэш картинки для уменьшенных копий'),
+        ),
+        migrations.CreateModel(
+            name='Avatar',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('original_image', models.ImageField(
+                    upload_to='',
+                    verbose_name='Картинка, которую загружал пользователь (до 1200x1200)'  # noqa: E501
+                )),
+                ('profile_image', models.ImageField(
+                    blank=True, editable=False, upload_to='',
+                    verbose_name='Обрезанная картинка, которая отображается в профиле (200х400)'  # noqa: E501
+                )),
+                ('comment_image', models.ImageField(
+                    blank=True, editable=False, upload_to='',
+                    verbose_name='Обрезанная картинка, которая отображается в комментариях (20х20)'  # noqa: E501
+                )),
+                ('user', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'аватар',
+                'verbose_name_plural': 'аватары',
+            },
+        ),
+    ]
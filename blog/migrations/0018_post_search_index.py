@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE blog_post_search USING fts5('
+            'title, text, comments, '
+            "tokenize = 'unicode61 remove_diacritics 2', "
+            "prefix = '2 3')"
+        )
+        # заголовок весит больше текста, комментарии — меньше всего
+        schema_editor.execute(
+            'INSERT INTO blog_post_search(blog_post_search, rank) '
+            "VALUES('rank', 'bm25(10.0, 1.0, 0.5)')"
+        )
+        schema_editor.execute(
+            'INSERT INTO blog_post_search(rowid, title, text, comments) '
+            'SELECT post.id, post.title, post.text, '
+            "(SELECT group_concat(comment.text, ' ') "
+            'FROM blog_comment AS comment '
+            'WHERE comment.post_id = post.id) '
+            'FROM blog_post AS post'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX post_search_vector_idx ON blog_post USING gin (('
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+            '))'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE blog_post_search')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX post_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_avatar_post_image_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageView',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('path', models.CharField(
+                    max_length=200, verbose_name='Адрес страницы')),
+                ('post_slug', models.SlugField(
+                    blank=True, max_length=200,
+                    verbose_name='Название поста в виде url')),
+                ('minute', models.DateTimeField(verbose_name='Минута')),
+                ('views_count', models.PositiveIntegerField(
+                    default=0, verbose_name='Число просмотров')),
+            ],
+            options={
+                'verbose_name': 'просмотры страницы',
+                'verbose_name_plural': 'просмотры страниц',
+                'indexes': [
+                    models.Index(
+                        fields=['minute', 'post_slug'],
+                        name='page_view_minute_slug_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('path', 'minute'),
+                        name='page_view_path_minute_uniq'),
+                ],
+            },
+        ),
+    ]
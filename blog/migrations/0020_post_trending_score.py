@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_post_views(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PageView = apps.get_model('blog', 'PageView')
+    views = (
+        PageView.objects
+        .filter(post_slug=OuterRef('slug'))
+        .order_by()
+        .values('post_slug')
+        .annotate(total=Sum('views_count'))
+        .values('total')
+    )
+    Post.objects.update(views_count=Coalesce(Subquery(views), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_pageview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(
+                default=0, editable=False,
+                verbose_name='Рейтинг для блока популярных постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_stale',
+            field=models.BooleanField(
+                default=True, editable=False,
+                verbose_name='Рейтинг нужно пересчитать'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name='Число просмотров'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-trending_score'], name='post_trending_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                condition=models.Q(('trending_stale', True)),
+                fields=['id'],
+                name='post_trending_stale_idx'),
+        ),
+        migrations.RunPython(count_post_views, migrations.RunPython.noop),
+    ]
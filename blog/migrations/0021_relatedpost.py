@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_post_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('score', models.FloatField(
+                    verbose_name='Сходство по тегам')),
+                ('post', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='related_links', to='blog.post',
+                    verbose_name='Пост')),
+                ('related', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='related_backlinks', to='blog.post',
+                    verbose_name='Похожий пост')),
+            ],
+            options={
+                'verbose_name': 'похожий пост',
+                'verbose_name_plural': 'похожие посты',
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('post', 'related'),
+                        name='related_post_uniq'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils.text import slugify
+
+
+BATCH_SIZE = 1000
+SLUG_MAX_LENGTH = {'post': 200, 'tag': 50}
+
+
+def iterate_batches(queryset):
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[
+            :BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def add_id_suffix(slug, instance_id, model_name, is_taken):
+    """Дописывает к слагу id, а если и такой слаг занят — ещё и номер."""
+    base_slug = slug or model_name
+    suffix = f'-{instance_id}'
+    number = 1
+    while True:
+        candidate = (
+            base_slug[:SLUG_MAX_LENGTH[model_name] - len(suffix)] + suffix)
+        if not is_taken(candidate):
+            return candidate
+        number += 1
+        suffix = f'-{instance_id}-{number}'
+
+
+def fill_tags_slugs(apps, schema_editor):
+    Tag = apps.get_model('blog', 'Tag')
+    titles_slugs = {
+        slugify(title, allow_unicode=True)[:SLUG_MAX_LENGTH['tag']]
+        for title in Tag.objects.values_list('title', flat=True).iterator()
+    }
+    taken_slugs = set()
+
+    def is_taken(slug):
+        # суффикс не должен совпасть со слагом ещё не обработанного тега
+        return slug in taken_slugs or slug in titles_slugs
+
+    for tags in iterate_batches(Tag.objects.only('id', 'title')):
+        for tag in tags:
+            tag.slug = slugify(tag.title, allow_unicode=True)[
+                :SLUG_MAX_LENGTH['tag']]
+            if not tag.slug or tag.slug in taken_slugs:
+                tag.slug = add_id_suffix(tag.slug, tag.id, 'tag', is_taken)
+            taken_slugs.add(tag.slug)
+        Tag.objects.bulk_update(tags, ['slug'])
+
+
+def make_posts_slugs_unique(apps, schema_editor):
+    """Добавляет id к повторяющимся и пустым слагам, кроме самого старого.
+
+    Слаг с суффиксом сверяется и с базой, и с уже выданными: у поста
+    может оказаться слаг `a-2`, который совпадёт с переименованным `a`.
+    """
+    Post = apps.get_model('blog', 'Post')
+    duplicated_slugs = (
+        Post.objects
+        .values('slug')
+        .annotate(posts_count=Count('id'))
+        .filter(posts_count__gt=1)
+        .values_list('slug', flat=True)
+    )
+    renamed_posts = Post.objects.filter(
+        Q(slug__in=list(duplicated_slugs)) | Q(slug=''))
+    kept_slugs = set()
+    new_slugs = set()
+
+    def is_taken(slug):
+        return (
+            slug in new_slugs or Post.objects.filter(slug=slug).exists())
+
+    for posts in iterate_batches(renamed_posts.only('id', 'slug')):
+        changed_posts = []
+        for post in posts:
+            if post.slug and post.slug not in kept_slugs:
+                kept_slugs.add(post.slug)
+                continue
+            post.slug = add_id_suffix(post.slug, post.id, 'post', is_taken)
+            new_slugs.add(post.slug)
+            changed_posts.append(post)
+        Post.objects.bulk_update(changed_posts, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(
+                allow_unicode=True, blank=True, null=True,
+                verbose_name='Название в виде url'),
+        ),
+        migrations.RunPython(fill_tags_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(
+                allow_unicode=True, blank=True, unique=True,
+                verbose_name='Название в виде url'),
+        ),
+        migrations.RunPython(
+            make_posts_slugs_unique, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='post',
+            name='slug',
+            field=models.SlugField(
+                max_length=200, unique=True,
+                verbose_name='Название в виде url'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+
+BATCH_SIZE = 500
+TEASER_LENGTH = 200
+
+
+def render_posts_texts(apps, schema_editor):
+    """Заполняет анонсы и HTML у постов, сохранённых до миграции.
+
+    Повторяет `Post.render_text`: у исторической модели его методов нет.
+    """
+    Post = apps.get_model('blog', 'Post')
+    posts = Post.objects.order_by('id').only('id', 'text')
+    last_id = 0
+    while True:
+        batch = list(posts.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        for post in batch:
+            post.teaser = post.text[:TEASER_LENGTH]
+            post.text_html = linebreaks(post.text, autoescape=True)
+        Post.objects.bulk_update(batch, ['teaser', 'text_html'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0023_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='teaser',
+            field=models.CharField(
+                blank=True, editable=False, max_length=200,
+                verbose_name='Анонс для лент'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(
+                blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.RunPython(render_posts_texts, migrations.RunPython.noop),
+    ]
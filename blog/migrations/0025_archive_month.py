@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def fill_archive_months(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ArchiveMonth = apps.get_model('blog', 'ArchiveMonth')
+    months = (
+        Post.objects
+        .annotate(month=TruncMonth('published_at'))
+        .values('month')
+        .annotate(posts_count=Count('id'))
+        .order_by()
+    )
+    ArchiveMonth.objects.bulk_create([
+        ArchiveMonth(month=row['month'].date(), posts_count=row['posts_count'])
+        for row in months
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0024_post_teaser_text_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('month', models.DateField(
+                    unique=True, verbose_name='Первый день месяца')),
+                ('posts_count', models.PositiveIntegerField(
+                    default=0, verbose_name='Число постов')),
+            ],
+            options={
+                'verbose_name': 'месяц архива',
+                'verbose_name_plural': 'месяцы архива',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.RunPython(fill_archive_months, migrations.RunPython.noop),
+    ]
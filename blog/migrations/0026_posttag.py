@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_published_at(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostTag = apps.get_model('blog', 'PostTag')
+    published_at = Post.objects.filter(
+        pk=OuterRef('post_id')).values('published_at')[:1]
+    PostTag.objects.update(published_at=Subquery(published_at))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0025_archive_month'),
+    ]
+
+    operations = [
+        # таблица связей уже есть, меняется только её описание в Django
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostTag',
+                    fields=[
+                        ('id', models.AutoField(
+                            auto_created=True, primary_key=True,
+                            serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(
+                            on_delete=django.db.models.deletion.CASCADE,
+                            to='blog.post', verbose_name='Пост')),
+                        ('tag', models.ForeignKey(
+                            on_delete=django.db.models.deletion.CASCADE,
+                            to='blog.tag', verbose_name='Тег')),
+                    ],
+                    options={
+                        'verbose_name': 'тег поста',
+                        'verbose_name_plural': 'теги постов',
+                        'db_table': 'blog_post_tags',
+                        'unique_together': {('post', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='tags',
+                    field=models.ManyToManyField(
+                        related_name='posts', through='blog.PostTag',
+                        to='blog.tag', verbose_name='Теги'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='posttag',
+            name='published_at',
+            field=models.DateTimeField(
+                editable=False, null=True,
+                verbose_name='Дата и время публикации поста'),
+        ),
+        migrations.RunPython(fill_published_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(
+                fields=['tag', '-published_at', '-post'],
+                name='post_tag_published_at_idx'),
+        ),
+    ]
@@ -1,14 +1,106 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils.html import linebreaks
+from django.utils.text import slugify
 from django.contrib.auth.models import User
 
 
+TEASER_LENGTH = 200
+
+
+class PostQuerySet(models.QuerySet):
+
+    def popular(self):
+        return self.order_by('-likes_count')
+
+    def fresh(self):
+        return self.order_by('-published_at')
+
+    def trending(self):
+        return self.order_by('-trending_score')
+
+    def prefetch_tags(self):
+        tags_with_counts = Tag.objects.annotate(
+            posts_count=Count('posts', distinct=True),
+        )
+        return self.prefetch_related(
+            Prefetch('tags', queryset=tags_with_counts),
+        )
+
+    def prefetch_tags_with_counts(self):
+        return self.select_related('author').prefetch_tags()
+
+    def recount_counters(self):
+        """Пересчитывает `likes_count` и `comments_count` одним UPDATE.
+
+        Счётчики обычно поддерживаются сигналами через `F()`, а этот
+        метод нужен там, где инкремент посчитать нельзя: при удалении
+        лайков, `clear()` и массовой загрузке данных. Рейтинг постов
+        после пересчёта помечается устаревшим.
+        """
+        likes = (
+            Post.likes.through.objects
+            .filter(post_id=OuterRef('pk'))
+            .order_by()
+            .values('post_id')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        comments = (
+            Comment.objects
+            .filter(post_id=OuterRef('pk'))
+            .order_by()
+            .values('post_id')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return self.update(
+            likes_count=Coalesce(Subquery(likes), 0),
+            comments_count=Coalesce(Subquery(comments), 0),
+            trending_stale=True,
+        )
+
+
+class TagQuerySet(models.QuerySet):
+
+    def popular(self):
+        return self.annotate(
+            posts_count=Count('posts', distinct=True),
+        ).order_by('-posts_count')
+
+
+class PostTagQuerySet(models.QuerySet):
+
+    def fill_published_at(self):
+        """Копирует в связи дату публикации их постов одним UPDATE."""
+        published_at = Post.objects.filter(
+            pk=OuterRef('post_id')).values('published_at')[:1]
+        return self.update(published_at=Subquery(published_at))
+
+
 class Post(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     text = models.TextField('Текст')
-    slug = models.SlugField('Название в виде url', max_length=200)
+    teaser = models.CharField(
+        'Анонс для лент',
+        max_length=TEASER_LENGTH,
+        blank=True,
+        editable=False)
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False)
+    slug = models.SlugField('Название в виде url', max_length=200, unique=True)
     image = models.ImageField('Картинка')
+    image_hash = models.CharField(
+        'Хэш картинки для уменьшенных копий',
+        max_length=32,
+        blank=True,
+        editable=False)
     published_at = models.DateTimeField('Дата и время публикации')
+    updated_at = models.DateTimeField('Когда изменён', auto_now=True)
 
     author = models.ForeignKey(
         User,
@@ -22,23 +114,73 @@ class Post(models.Model):
         blank=True)
     tags = models.ManyToManyField(
         'Tag',
+        through='PostTag',
         related_name='posts',
         verbose_name='Теги')
 
+    likes_count = models.PositiveIntegerField(
+        'Число лайков',
+        default=0,
+        editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False)
+    views_count = models.PositiveIntegerField(
+        'Число просмотров',
+        default=0,
+        editable=False)
+    trending_score = models.FloatField(
+        'Рейтинг для блока популярных постов',
+        default=0,
+        editable=False)
+    trending_stale = models.BooleanField(
+        'Рейтинг нужно пересчитать',
+        default=True,
+        editable=False)
+
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
-        return reverse('post_detail', args={'slug': self.slug})
+        return reverse('post_detail', args=[self.slug])
+
+    def render_text(self):
+        """Готовит анонс и HTML текста, чтобы ленты не читали весь текст."""
+        self.teaser = self.text[:TEASER_LENGTH]
+        self.text_html = linebreaks(self.text, autoescape=True)
 
     class Meta:
         ordering = ['-published_at']
+        indexes = [
+            models.Index(fields=['-likes_count'], name='post_likes_count_idx'),
+            models.Index(
+                fields=['-published_at', '-id'],
+                name='post_published_at_id_idx'),
+            models.Index(
+                fields=['-trending_score'],
+                name='post_trending_score_idx'),
+            models.Index(
+                fields=['id'],
+                condition=Q(trending_stale=True),
+                name='post_trending_stale_idx'),
+        ]
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
 
 
 class Tag(models.Model):
     title = models.CharField('Тег', max_length=20, unique=True)
+    slug = models.SlugField(
+        'Название в виде url',
+        max_length=50,
+        unique=True,
+        allow_unicode=True,
+        blank=True)
+
+    objects = TagQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -46,8 +188,31 @@ class Tag(models.Model):
     def clean(self):
         self.title = self.title.lower()
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = self.make_unique_slug()
+        super().save(*args, **kwargs)
+
+    def make_unique_slug(self):
+        """Слаг из заголовка, которого нет у других тегов.
+
+        Из заголовков вроде `!!!` slugify делает пустую строку, а из
+        `C` и `C++` — одинаковые слаги, поэтому пустой слаг заменяется
+        на `tag`, а занятый получает номер: `c-2`, `c-3`.
+        """
+        max_length = self._meta.get_field('slug').max_length
+        base_slug = slugify(self.title, allow_unicode=True) or 'tag'
+        slug = base_slug[:max_length]
+        other_tags = Tag.objects.exclude(pk=self.pk)
+        number = 1
+        while other_tags.filter(slug=slug).exists():
+            number += 1
+            suffix = f'-{number}'
+            slug = base_slug[:max_length - len(suffix)] + suffix
+        return slug
+
     def get_absolute_url(self):
-        return reverse('tag_filter', args={'tag_title': self.slug})
+        return reverse('tag_filter', args=[self.slug])
 
     class Meta:
         ordering = ['title']
@@ -55,10 +220,44 @@ class Tag(models.Model):
         verbose_name_plural = 'теги'
 
 
+class PostTag(models.Model):
+    """Связь поста с тегом и копия даты публикации поста.
+
+    Страница тега сортирует посты по дате, и без копии база соединяет
+    все посты тега и сортирует их во временном B-дереве. С индексом
+    `(tag, -published_at, -post)` страница читается прямо из индекса
+    связей. Связи без даты появляются на миг внутри `tags.add()`: дату
+    проставляет сигнал `m2m_changed`, а при смене даты поста — `post_save`.
+    """
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, verbose_name='Пост')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, verbose_name='Тег')
+    published_at = models.DateTimeField(
+        'Дата и время публикации поста', null=True, editable=False)
+
+    objects = PostTagQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.post_id} #{self.tag_id}'
+
+    class Meta:
+        db_table = 'blog_post_tags'
+        unique_together = [['post', 'tag']]
+        indexes = [
+            models.Index(
+                fields=['tag', '-published_at', '-post'],
+                name='post_tag_published_at_idx'),
+        ]
+        verbose_name = 'тег поста'
+        verbose_name_plural = 'теги постов'
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         'Post',
         on_delete=models.CASCADE,
+        related_name='comments',
         verbose_name='Пост, к которому написан')
     author = models.ForeignKey(
         User,
@@ -73,5 +272,100 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['published_at']
+        indexes = [
+            models.Index(
+                fields=['post', 'published_at', 'id'],
+                name='comment_post_published_at_idx'),
+        ]
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
+
+
+class Avatar(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь')
+    original_image = models.ImageField(
+        'Картинка, которую загружал пользователь (до 1200x1200)')
+    profile_image = models.ImageField(
+        'Обрезанная картинка, которая отображается в профиле (200х400)',
+        blank=True,
+        editable=False)
+    comment_image = models.ImageField(
+        'Обрезанная картинка, которая отображается в комментариях (20х20)',
+        blank=True,
+        editable=False)
+
+    def __str__(self):
+        return f'Аватар пользователя {self.user_id}'
+
+    class Meta:
+        verbose_name = 'аватар'
+        verbose_name_plural = 'аватары'
+
+
+class PageView(models.Model):
+    path = models.CharField('Адрес страницы', max_length=200)
+    post_slug = models.SlugField(
+        'Название поста в виде url',
+        max_length=200,
+        blank=True)
+    minute = models.DateTimeField('Минута')
+    views_count = models.PositiveIntegerField('Число просмотров', default=0)
+
+    def __str__(self):
+        return f'{self.path} в {self.minute:%Y-%m-%d %H:%M}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['path', 'minute'],
+                name='page_view_path_minute_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['minute', 'post_slug'],
+                name='page_view_minute_slug_idx'),
+        ]
+        verbose_name = 'просмотры страницы'
+        verbose_name_plural = 'просмотры страниц'
+
+
+class RelatedPost(models.Model):
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='related_links',
+        verbose_name='Пост')
+    related = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='related_backlinks',
+        verbose_name='Похожий пост')
+    score = models.FloatField('Сходство по тегам')
+
+    def __str__(self):
+        return f'{self.post_id} → {self.related_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'related'],
+                name='related_post_uniq'),
+        ]
+        verbose_name = 'похожий пост'
+        verbose_name_plural = 'похожие посты'
+
+
+class ArchiveMonth(models.Model):
+    month = models.DateField('Первый день месяца', unique=True)
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+
+    def __str__(self):
+        return f'{self.month:%Y-%m}: {self.posts_count}'
+
+    class Meta:
+        ordering = ['-month']
+        verbose_name = 'месяц архива'
+        verbose_name_plural = 'месяцы архива'
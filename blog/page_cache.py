@@ -0,0 +1,176 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+
+VERSION_KEY_PREFIX = 'version'
+PAGE_KEY_PREFIX = 'page'
+
+FEED_SCOPE = 'feed'
+SIDEBAR_SCOPE = 'sidebar'
+RELATED_SCOPE = 'related'
+SYNDICATION_SCOPE = 'syndication'
+
+
+def get_post_scope(slug):
+    return f'post:{slug}'
+
+
+def get_tag_scope(slug):
+    return f'tag:{slug}'
+
+
+def get_version_key(scope):
+    return f'{VERSION_KEY_PREFIX}:{scope}'
+
+
+def get_versions(*scopes):
+    """Отдаёт версии кэша для набора областей страницы.
+
+    Версия — это время последнего изменения области в секундах, поэтому
+    из неё же получается `Last-Modified`. Если версии в кэше нет, она
+    заводится с текущим временем: это безопасно, старые записи просто
+    перестанут находиться.
+    """
+    keys = {get_version_key(scope): scope for scope in scopes}
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {scope: versions[key] for key, scope in keys.items()}
+
+
+async def aget_versions(*scopes):
+    keys = {get_version_key(scope): scope for scope in scopes}
+    versions = await cache.aget_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return {scope: versions[key] for key, scope in keys.items()}
+
+
+def bump_versions(*scopes):
+    now = time.time()
+    cache.set_many({get_version_key(scope): now for scope in scopes}, None)
+
+
+def attach_cache_versions(serialized_posts):
+    """Добавляет к карточкам постов версии для `{% cache %}` фрагментов."""
+    versions = get_versions(
+        *(get_post_scope(post['slug']) for post in serialized_posts))
+    for post in serialized_posts:
+        post['cache_version'] = versions[get_post_scope(post['slug'])]
+    return serialized_posts
+
+
+async def aattach_cache_versions(serialized_posts):
+    versions = await aget_versions(
+        *(get_post_scope(post['slug']) for post in serialized_posts))
+    for post in serialized_posts:
+        post['cache_version'] = versions[get_post_scope(post['slug'])]
+    return serialized_posts
+
+
+def make_page_key(request, versions, absolute=False):
+    """Ключ страницы из её адреса и версий областей.
+
+    С `absolute` в ключ идут схема и хост: так страница, в которой есть
+    абсолютные ссылки, не отдаётся с чужим адресом.
+    """
+    path = request.build_absolute_uri() if absolute else (
+        request.get_full_path())
+    versions_part = ','.join(
+        f'{scope}={version}' for scope, version in sorted(versions.items()))
+    raw_key = f'{path}|{versions_part}'
+    return f'{PAGE_KEY_PREFIX}:{hashlib.md5(raw_key.encode()).hexdigest()}'
+
+
+def cache_page_by_versions(get_scopes):
+    """Кэширует страницу для анонимов с ключом из версий её областей.
+
+    `get_scopes` получает аргументы view и возвращает области, от которых
+    зависит страница. Сигналы поднимают версию области при изменении
+    постов, тегов и комментариев, и закэшированные страницы с устаревшей
+    версией больше не находятся. Условные GET сверяются с сохранёнными
+    `ETag` и `Last-Modified` и получают 304 без рендера шаблона.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return make_async_wrapper(view, get_scopes)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            versions = get_versions(*get_scopes(*args, **kwargs))
+            page_key = make_page_key(request, versions)
+            response = cache.get(page_key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if not is_cacheable(response):
+                    return response
+                set_validators(response, page_key, versions)
+                patch_vary_headers(response, ['Cookie'])
+                cache.set(page_key, response, settings.PAGE_CACHE_TIMEOUT)
+            return get_cached_response(request, response)
+        return wrapper
+    return decorator
+
+
+def make_async_wrapper(view, get_scopes):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await view(request, *args, **kwargs)
+        user = await request.auser()
+        if user.is_authenticated:
+            return await view(request, *args, **kwargs)
+
+        versions = await aget_versions(*get_scopes(*args, **kwargs))
+        page_key = make_page_key(request, versions)
+        response = await cache.aget(page_key)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+            if not is_cacheable(response):
+                return response
+            set_validators(response, page_key, versions)
+            patch_vary_headers(response, ['Cookie'])
+            await cache.aset(
+                page_key, response, settings.PAGE_CACHE_TIMEOUT)
+        return get_cached_response(request, response)
+    return wrapper
+
+
+def is_cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def get_cached_response(request, response):
+    return get_conditional_response(
+        request,
+        etag=response['ETag'],
+        last_modified=parse_http_date_safe(response['Last-Modified']),
+        response=response,
+    )
+
+
+def set_validators(response, page_key, versions):
+    response['ETag'] = f'"{page_key.split(":", 1)[1]}"'
+    last_modified = max(versions.values())
+    if response.has_header('Last-Modified'):
+        last_modified = max(
+            last_modified,
+            parse_http_date_safe(response['Last-Modified']) or 0,
+        )
+    response['Last-Modified'] = http_date(last_modified)
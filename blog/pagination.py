@@ -0,0 +1,197 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.http import Http404
+from django.utils.encoding import force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from blog.models import PostTag
+
+
+POSTS_PER_PAGE = 5
+TAG_POSTS_PER_PAGE = 20
+ARCHIVE_POSTS_PER_PAGE = 20
+COMMENTS_PER_CHUNK = 50
+
+
+class KeysetPage(NamedTuple):
+    objects: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+
+def encode_cursor(instance, id_field='id'):
+    raw = f'{instance.published_at.isoformat()},{getattr(instance, id_field)}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(cursor):
+    try:
+        published_at, instance_id = force_str(
+            urlsafe_base64_decode(cursor)).rsplit(',', 1)
+        return datetime.fromisoformat(published_at), int(instance_id)
+    except (ValueError, UnicodeDecodeError):
+        raise Http404('Некорректный курсор страницы')
+
+
+def encode_rank_cursor(rank, instance_id):
+    """Курсор для выдачи, отсортированной по релевантности."""
+    return urlsafe_base64_encode(f'{rank!r},{instance_id}'.encode())
+
+
+def decode_rank_cursor(cursor):
+    try:
+        rank, instance_id = force_str(
+            urlsafe_base64_decode(cursor)).rsplit(',', 1)
+        return float(rank), int(instance_id)
+    except (ValueError, UnicodeDecodeError):
+        raise Http404('Некорректный курсор страницы')
+
+
+def paginate_by_keyset(posts, after=None, before=None, page=1,
+                       per_page=POSTS_PER_PAGE, id_field='id'):
+    """Отдаёт страницу постов, отсортированных по `(published_at, id)`.
+
+    Курсор `after` — последний пост предыдущей страницы, `before` —
+    первый пост следующей. Вместо OFFSET запрос начинает чтение индекса
+    сразу с курсора, поэтому тысячная страница стоит столько же, сколько
+    первая. Условие записано как `published_at <= X` с исключением
+    границы, а не через OR: так SQLite видит диапазон и делает SEARCH
+    по индексу, а не SCAN. Если курсора нет, а номер страницы больше
+    первого (ссылку набрали руками), страница ищется через OFFSET.
+    `id_field` — поле с id поста, если листаются не сами посты.
+    """
+    if after:
+        published_at, post_id = decode_cursor(after)
+        posts = posts.filter(
+            published_at__lte=published_at,
+        ).exclude(
+            published_at=published_at, **{f'{id_field}__gte': post_id},
+        ).order_by('-published_at', f'-{id_field}')
+        start = 0
+    elif before:
+        published_at, post_id = decode_cursor(before)
+        posts = posts.filter(
+            published_at__gte=published_at,
+        ).exclude(
+            published_at=published_at, **{f'{id_field}__lte': post_id},
+        ).order_by('published_at', id_field)
+        start = 0
+    else:
+        posts = posts.order_by('-published_at', f'-{id_field}')
+        start = (page - 1) * per_page
+
+    page_posts = list(posts[start:start + per_page + 1])
+    has_more = len(page_posts) > per_page
+    page_posts = page_posts[:per_page]
+    if before:
+        page_posts.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, bool(after) or start > 0
+
+    if not page_posts:
+        return KeysetPage([], None, None)
+    return KeysetPage(
+        objects=page_posts,
+        next_cursor=(
+            encode_cursor(page_posts[-1], id_field) if has_next else None),
+        previous_cursor=(
+            encode_cursor(page_posts[0], id_field) if has_previous else None),
+    )
+
+
+def paginate_tag_posts(posts, tag_id, after=None, before=None, page=1,
+                       per_page=TAG_POSTS_PER_PAGE):
+    """Страница постов тега с теми же курсорами, что у `paginate_by_keyset`.
+
+    Листаются связи поста с тегом: дата публикации скопирована в них,
+    и индекс `(tag, -published_at, -post)` отдаёт id постов страницы
+    без JOIN и сортировки всех постов тега. Сами посты из `posts`
+    выбираются вторым запросом по первичному ключу.
+    """
+    links_page = paginate_by_keyset(
+        PostTag.objects.filter(tag_id=tag_id).only('post', 'published_at'),
+        after=after,
+        before=before,
+        page=page,
+        per_page=per_page,
+        id_field='post_id',
+    )
+    posts_ids = [link.post_id for link in links_page.objects]
+    posts_by_id = posts.in_bulk(posts_ids)
+    return links_page._replace(objects=[
+        posts_by_id[post_id] for post_id in posts_ids
+        if post_id in posts_by_id
+    ])
+
+
+def paginate_comments(comments, after=None, per_page=COMMENTS_PER_CHUNK):
+    """Отдаёт очередную порцию комментариев в хронологическом порядке.
+
+    Работает как `paginate_by_keyset`, только вперёд по времени и без
+    перехода назад: страница поста дочитывает комментарии порциями.
+    Возвращает список комментариев и курсор следующей порции.
+    """
+    if after:
+        published_at, comment_id = decode_cursor(after)
+        comments = comments.filter(
+            published_at__gte=published_at,
+        ).exclude(
+            published_at=published_at, id__lte=comment_id,
+        )
+    comments = list(
+        comments.order_by('published_at', 'id')[:per_page + 1])
+    next_cursor = None
+    if len(comments) > per_page:
+        comments = comments[:per_page]
+        next_cursor = encode_cursor(comments[-1])
+    return comments, next_cursor
+
+
+def estimate_rows_count(model, using):
+    """Оценивает число строк в таблице модели, не просматривая её.
+
+    В PostgreSQL берётся статистика планировщика, в остальных базах и
+    до первого ANALYZE — наибольший первичный ключ. Удалённые строки он
+    не учитывает, зато находится по индексу за один шаг.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    max_id = model._base_manager.using(using).aggregate(
+        max_id=Max('pk'))['max_id']
+    return max_id or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, который не считает COUNT(*) по всей таблице.
+
+    Если в списке нет фильтров и поиска, число строк оценивается через
+    `estimate_rows_count`, и оценке верят, когда она больше
+    `ADMIN_EXACT_COUNT_LIMIT`. Последние страницы по такой оценке могут
+    оказаться пустыми. Отфильтрованные списки и маленькие таблицы
+    считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.has_filters():
+            return super().count
+        estimate = estimate_rows_count(queryset.model, queryset.db)
+        if estimate <= settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
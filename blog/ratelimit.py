@@ -0,0 +1,31 @@
+import time
+
+from django.core.cache import cache
+
+
+RATE_LIMIT_KEY_PREFIX = 'ratelimit'
+
+
+def take_token(bucket_name, capacity, refill_seconds):
+    """Забирает жетон из корзины и отдаёт, сколько ждать, если их нет.
+
+    Корзина вмещает `capacity` жетонов и получает новый жетон раз в
+    `refill_seconds` секунд, поэтому допускает короткий всплеск запросов,
+    но не даёт держать высокий темп долго. Состояние хранится в общем
+    кэше; чтение и запись не атомарны, и при гонке двух процессов лимит
+    может пропустить лишний запрос — для защиты от флуда это допустимо.
+    Возвращает 0, если запрос разрешён, иначе число секунд до жетона.
+    """
+    key = f'{RATE_LIMIT_KEY_PREFIX}:{bucket_name}'
+    now = time.time()
+    tokens, updated_at = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated_at) / refill_seconds)
+    if tokens < 1:
+        return (1 - tokens) * refill_seconds
+    cache.set(key, (tokens - 1, now), capacity * refill_seconds)
+    return 0
+
+
+def get_client_ip(request):
+    # за обратным прокси адрес клиента должен подставлять сам прокси
+    return request.META.get('REMOTE_ADDR', '')
@@ -0,0 +1,174 @@
+import itertools
+import math
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Case, Count, F, FloatField, Sum, Value, When, Window)
+from django.db.models.functions import RowNumber
+
+from blog.models import Post, RelatedPost
+
+
+RELATED_POSTS_AMOUNT = 4
+
+
+def find_related_posts(post_id, posts_count):
+    """Ищет похожие посты одним агрегирующим запросом к базе.
+
+    Сходство — сумма IDF общих тегов: редкий тег говорит о близости
+    постов больше, чем тег, который стоит у половины блога. При равном
+    сходстве выше оказываются посты с большим рейтингом популярности.
+    Кандидаты те же, что при полной перестройке: только
+    `RELATED_POSTS_CANDIDATES_PER_TAG` самых популярных постов каждого
+    тега, иначе пост с частым тегом перебирал бы половину блога.
+    """
+    PostTag = Post.tags.through
+    tags_ids = list(
+        PostTag.objects.filter(post_id=post_id)
+        .values_list('tag_id', flat=True)
+    )
+    tags_posts_counts = (
+        PostTag.objects.filter(tag_id__in=tags_ids)
+        .values('tag_id')
+        .annotate(posts_count=Count('*'))
+        .values_list('tag_id', 'posts_count')
+    )
+    idf_cases = [
+        When(tag_id=tag_id, then=Value(math.log(posts_count / tag_count)))
+        for tag_id, tag_count in tags_posts_counts
+    ]
+    if not idf_cases:
+        return []
+    candidates_ids = set(
+        PostTag.objects.filter(tag_id__in=tags_ids)
+        .annotate(place=Window(
+            RowNumber(),
+            partition_by=F('tag_id'),
+            order_by=[F('post__trending_score').desc(), F('post_id')],
+        ))
+        .filter(place__lte=settings.RELATED_POSTS_CANDIDATES_PER_TAG)
+        .values_list('post_id', flat=True)
+    )
+    return list(
+        PostTag.objects.filter(tag_id__in=tags_ids, post_id__in=candidates_ids)
+        .exclude(post_id=post_id)
+        .values('post_id')
+        .annotate(score=Sum(Case(*idf_cases, output_field=FloatField())))
+        .filter(score__gt=0)
+        .order_by('-score', '-post__trending_score')
+        .values_list('post_id', 'score')[:RELATED_POSTS_AMOUNT]
+    )
+
+
+def refresh_related_posts(posts_ids):
+    """Пересчитывает похожие посты для постов, у которых сменились теги.
+
+    Списки других постов, где эти посты упоминаются, догонят
+    изменения при следующей полной перестройке.
+    """
+    posts_count = Post.objects.count()
+    for post_id in posts_ids:
+        related_posts = find_related_posts(post_id, posts_count)
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id=post_id).delete()
+            RelatedPost.objects.bulk_create([
+                RelatedPost(post_id=post_id, related_id=related_id,
+                            score=score)
+                for related_id, score in related_posts
+            ])
+
+
+def load_pairs(queryset, fields, dtype):
+    import numpy as np
+
+    rows = queryset.values_list(*fields).iterator(chunk_size=10000)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=dtype)
+    return flat.reshape(-1, len(fields))
+
+
+def rebuild_related_posts(batch_size):
+    """Заново считает похожие посты для всех постов блога.
+
+    Посты и теги укладываются в разреженную матрицу с весами IDF.
+    Сравнивать каждый пост с каждым слишком дорого, поэтому кандидатами
+    считаются только `RELATED_POSTS_CANDIDATES_PER_TAG` самых популярных
+    постов каждого тега: для редких тегов это все их посты, а среди
+    постов с частым тегом в выдачу всё равно попали бы популярные.
+    Точное сходство с кандидатами и выбор лучших считаются векторно
+    пачками по `batch_size` постов. Возвращает число записанных пар.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    posts = load_pairs(
+        Post.objects.order_by('id'), ['id', 'trending_score'], np.float64)
+    posts_ids = posts[:, 0].astype(np.int64)
+    trending_scores = posts[:, 1]
+    posts_tags = load_pairs(
+        Post.tags.through.objects.all(), ['post_id', 'tag_id'], np.int64)
+    post_index = np.searchsorted(posts_ids, posts_tags[:, 0])
+    # теги постов, созданных после выгрузки списка постов, пропускаем
+    known = post_index < len(posts_ids)
+    known[known] = posts_ids[post_index[known]] == posts_tags[known, 0]
+    posts_tags, post_index = posts_tags[known], post_index[known]
+    if not len(posts_tags):
+        RelatedPost.objects.all().delete()
+        return 0
+
+    _, tag_index = np.unique(posts_tags[:, 1], return_inverse=True)
+    posts_amount, tags_amount = len(posts_ids), tag_index.max() + 1
+    tags_posts_counts = np.bincount(tag_index, minlength=tags_amount)
+    idf = np.log(posts_amount / tags_posts_counts)
+
+    shape = (posts_amount, tags_amount)
+    weights = sparse.csr_matrix(
+        (idf[tag_index], (post_index, tag_index)), shape=shape)
+    has_tag = sparse.csr_matrix(
+        (np.ones(len(tag_index)), (post_index, tag_index)), shape=shape)
+
+    # места постов внутри тега по убыванию рейтинга популярности
+    by_tag = np.lexsort((-trending_scores[post_index], tag_index))
+    sorted_tags = tag_index[by_tag]
+    places = np.arange(len(by_tag)) - np.searchsorted(
+        sorted_tags, sorted_tags)
+    top = by_tag[places < settings.RELATED_POSTS_CANDIDATES_PER_TAG]
+    candidates = sparse.csr_matrix(
+        (np.ones(len(top)), (tag_index[top], post_index[top])),
+        shape=(tags_amount, posts_amount),
+    )
+
+    written = 0
+    for start in range(0, posts_amount, batch_size):
+        stop = min(start + batch_size, posts_amount)
+        pairs = (has_tag[start:stop] @ candidates).tocoo()
+        rows = pairs.row + start
+        columns = pairs.col
+        not_self = rows != columns
+        rows, columns = rows[not_self], columns[not_self]
+        scores = np.asarray(
+            weights[rows].multiply(has_tag[columns]).sum(axis=1)).ravel()
+
+        order = np.lexsort((-trending_scores[columns], -scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        places = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        best = (places < RELATED_POSTS_AMOUNT) & (scores > 0)
+
+        related_posts = list(zip(
+            posts_ids[rows[best]].tolist(),
+            posts_ids[columns[best]].tolist(),
+            scores[best].tolist(),
+        ))
+        with transaction.atomic(), connection.cursor() as cursor:
+            RelatedPost.objects.filter(
+                post_id__gte=posts_ids[start],
+                post_id__lte=posts_ids[stop - 1],
+            ).delete()
+            # миллионы строк без создания объектов моделей
+            cursor.executemany(
+                f'INSERT INTO {RelatedPost._meta.db_table} '
+                f'(post_id, related_id, score) VALUES (%s, %s, %s)',
+                related_posts,
+            )
+        written += len(related_posts)
+    return written
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+from blog.models import Avatar, Post
+from blog.page_cache import FEED_SCOPE, bump_versions, get_post_scope
+
+
+POST_IMAGE_WIDTHS = (360, 750, 1140)
+AVATAR_SIZES = {
+    'profile_image': (200, 400),
+    'comment_image': (20, 20),
+}
+RENDITIONS_DIR = 'renditions'
+QUALITY = 80
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RENDITION_WORKERS,
+    thread_name_prefix='renditions',
+)
+
+
+def get_rendition_formats():
+    """Форматы, которые умеет кодировать установленный Pillow."""
+    return [
+        image_format for image_format in ('avif', 'webp')
+        if features.check(image_format)
+    ]
+
+
+def get_content_hash(path):
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()[:32]
+
+
+def get_rendition_name(content_hash, name, image_format):
+    return os.path.join(
+        RENDITIONS_DIR, content_hash[:2], content_hash,
+        f'{name}.{image_format}',
+    )
+
+
+def save_rendition(image, media_root, name):
+    path = os.path.join(media_root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # пишем во временный файл, чтобы читатели не увидели половину картинки
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    image.save(tmp_path, quality=QUALITY, format=name.rsplit('.', 1)[1])
+    os.replace(tmp_path, path)
+
+
+def build_post_renditions(source_path, media_root, formats):
+    """Готовит уменьшенные копии картинки поста и возвращает хэш оригинала.
+
+    Имена копий строятся из хэша содержимого, поэтому одинаковые
+    картинки обрабатываются один раз, а уже готовые копии на диске
+    пропускаются. Функция не трогает базу и подходит для пула процессов.
+    """
+    content_hash = get_content_hash(source_path)
+    missing = [
+        (width, image_format)
+        for width in POST_IMAGE_WIDTHS
+        for image_format in formats
+        if not os.path.exists(os.path.join(
+            media_root,
+            get_rendition_name(content_hash, f'{width}w', image_format),
+        ))
+    ]
+    if not missing:
+        return content_hash
+
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        for width, image_format in missing:
+            rendition = original.copy()
+            # не увеличиваем картинки меньше нужной ширины
+            rendition.thumbnail((width, width * 10))
+            save_rendition(
+                rendition,
+                media_root,
+                get_rendition_name(content_hash, f'{width}w', image_format),
+            )
+    return content_hash
+
+
+def build_avatar_renditions(source_path, media_root, image_format):
+    content_hash = get_content_hash(source_path)
+    names = {
+        field_name: get_rendition_name(content_hash, field_name, image_format)
+        for field_name in AVATAR_SIZES
+    }
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        for field_name, size in AVATAR_SIZES.items():
+            name = names[field_name]
+            if not os.path.exists(os.path.join(media_root, name)):
+                save_rendition(ImageOps.fit(original, size), media_root, name)
+    return names
+
+
+def get_post_image_srcsets(content_hash):
+    """Отдаёт значения `srcset` для каждого формата уменьшенных копий."""
+    if not content_hash:
+        return {}
+    srcsets = {}
+    for image_format in get_rendition_formats():
+        candidates = []
+        for width in POST_IMAGE_WIDTHS:
+            name = get_rendition_name(content_hash, f'{width}w', image_format)
+            candidates.append(f'{default_storage.url(name)} {width}w')
+        srcsets[image_format] = ', '.join(candidates)
+    return srcsets
+
+
+def generate_post_renditions(post_id):
+    try:
+        post = Post.objects.only('slug', 'image').get(pk=post_id)
+        if not post.image:
+            return
+        content_hash = build_post_renditions(
+            post.image.path, settings.MEDIA_ROOT, get_rendition_formats())
+        updated = Post.objects.filter(
+            pk=post_id, image=post.image.name,
+        ).exclude(image_hash=content_hash).update(image_hash=content_hash)
+        if updated:
+            bump_versions(FEED_SCOPE, get_post_scope(post.slug))
+    except Exception:
+        logger.exception('Не удалось подготовить картинки поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def generate_avatar_renditions(avatar_id):
+    try:
+        avatar = Avatar.objects.get(pk=avatar_id)
+        names = build_avatar_renditions(
+            avatar.original_image.path, settings.MEDIA_ROOT, 'webp')
+        Avatar.objects.filter(
+            pk=avatar_id, original_image=avatar.original_image.name,
+        ).update(**names)
+    except Exception:
+        logger.exception('Не удалось подготовить аватар %s', avatar_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_post_renditions(post_id):
+    executor.submit(generate_post_renditions, post_id)
+
+
+def schedule_avatar_renditions(avatar_id):
+    executor.submit(generate_avatar_renditions, avatar_id)
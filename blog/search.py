@@ -0,0 +1,284 @@
+import logging
+import re
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import NotSupportedError, connections, router, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from blog.models import Comment, Post
+from blog.pagination import decode_rank_cursor, encode_rank_cursor
+from blog.serializers import select_post_fields
+from blog.tasks import BackgroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_TABLE = 'blog_post_search'
+SEARCH_RESULTS_PER_PAGE = 10
+SEARCH_MAX_TERMS = 8
+SNIPPET_WORDS = 24
+SEARCH_INDEX_BATCH_SIZE = 500
+
+# границы подсветки, которых не бывает в тексте: HTML экранируется
+# целиком, а потом они заменяются на <mark>
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+TERM_RE = re.compile(r'\w+')
+
+POSTGRES_SEARCH_CONFIG = 'russian'
+# то же выражение, что в GIN-индексе из миграции, иначе индекс
+# не будет использоваться
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+)
+
+
+class SearchHit(NamedTuple):
+    post_id: int
+    rank: float
+    snippet: str
+
+
+def make_fts_query(query):
+    """Превращает строку из формы поиска в запрос FTS5.
+
+    Синтаксис FTS5 пользователю не доступен: каждое слово берётся
+    в кавычки, а последнее ищется по префиксу, чтобы находились посты
+    по недописанному слову.
+    """
+    terms = TERM_RE.findall(query.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def search_sqlite(connection, query, after, per_page):
+    fts_query = make_fts_query(query)
+    if not fts_query:
+        return []
+    sql = (
+        f'SELECT rowid, rank, snippet({SEARCH_TABLE}, -1, %s, %s, %s, %s) '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    )
+    params = [SNIPPET_START, SNIPPET_END, '…', SNIPPET_WORDS, fts_query]
+    if after:
+        rank, post_id = decode_rank_cursor(after)
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, post_id]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+def search_postgresql(connection, query, after, per_page):
+    from django.contrib.postgres.search import (
+        SearchHeadline, SearchQuery, SearchRank, SearchVectorField)
+
+    search_query = SearchQuery(
+        query, config=POSTGRES_SEARCH_CONFIG, search_type='websearch')
+    search_vector = RawSQL(
+        POSTGRES_SEARCH_VECTOR, [], output_field=SearchVectorField())
+    posts = (
+        Post.objects.using(connection.alias)
+        .annotate(search_vector=search_vector)
+        .filter(search_vector=search_query)
+        # со знаком минус, чтобы лучшие результаты шли первыми, как в BM25
+        .annotate(rank=-SearchRank(search_vector, search_query))
+    )
+    if after:
+        rank, post_id = decode_rank_cursor(after)
+        posts = posts.filter(Q(rank__gt=rank) | Q(rank=rank, id__gt=post_id))
+    posts = posts.annotate(
+        snippet=SearchHeadline(
+            'text',
+            search_query,
+            config=POSTGRES_SEARCH_CONFIG,
+            start_sel=SNIPPET_START,
+            stop_sel=SNIPPET_END,
+            max_words=SNIPPET_WORDS,
+            min_words=SNIPPET_WORDS // 2,
+        ),
+    ).order_by('rank', 'id').values_list('id', 'rank', 'snippet')
+    return [SearchHit(*row) for row in posts[:per_page]]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': search_sqlite,
+    'postgresql': search_postgresql,
+}
+
+
+def format_snippet(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(SNIPPET_START, '<mark>')
+        .replace(SNIPPET_END, '</mark>')
+    )
+
+
+def search_posts(query, after=None, per_page=SEARCH_RESULTS_PER_PAGE):
+    """Ищет посты по заголовку, тексту и комментариям.
+
+    В SQLite поиск идёт по таблице FTS5 с ранжированием BM25, в Postgres —
+    по GIN-индексу на `tsvector` заголовка и текста. Выдача листается
+    курсором по паре (ранг, id), как лента по дате. Возвращает пары
+    «пост, подсвеченный фрагмент» и курсор следующей страницы.
+    """
+    connection = connections[router.db_for_read(Post)]
+    try:
+        search_backend = SEARCH_BACKENDS[connection.vendor]
+    except KeyError:
+        raise NotSupportedError(
+            f'Поиск не поддерживает базу {connection.vendor}')
+
+    hits = search_backend(connection, query, after, per_page + 1)
+    next_cursor = None
+    if len(hits) > per_page:
+        hits = hits[:per_page]
+        next_cursor = encode_rank_cursor(hits[-1].rank, hits[-1].post_id)
+
+    posts = select_post_fields(Post.objects.all()).in_bulk(
+        [hit.post_id for hit in hits])
+    results = [
+        (posts[hit.post_id], format_snippet(hit.snippet))
+        for hit in hits
+        if hit.post_id in posts
+    ]
+    return results, next_cursor
+
+
+def get_search_connection():
+    """Соединение для записи в FTS5 или None, если индекс ведёт сама база.
+
+    В Postgres индекс построен по выражению и обновляется вместе
+    со строкой поста.
+    """
+    connection = connections[router.db_for_write(Post)]
+    if connection.vendor != 'sqlite':
+        return None
+    return connection
+
+
+def update_search_index(posts_ids):
+    connection = get_search_connection()
+    if connection is None or not posts_ids:
+        return
+    if settings.SEARCH_INCLUDE_COMMENTS:
+        comments_sql = (
+            f"(SELECT group_concat(comment.text, ' ') "
+            f'FROM {Comment._meta.db_table} AS comment '
+            f'WHERE comment.post_id = post.id)'
+        )
+    else:
+        comments_sql = "''"
+    placeholders = ', '.join(['%s'] * len(posts_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+            f'(rowid, title, text, comments) '
+            f'SELECT post.id, post.title, post.text, {comments_sql} '
+            f'FROM {Post._meta.db_table} AS post '
+            f'WHERE post.id IN ({placeholders})',
+            list(posts_ids),
+        )
+
+
+class StalePostsIndexer(BackgroundWorker):
+    """Откладывает переиндексацию постов с новыми комментариями.
+
+    С `SEARCH_INCLUDE_COMMENTS` пост в индексе хранит склейку всех своих
+    комментариев, и переиндексировать его на каждый комментарий дорого.
+    Посты копятся во множестве, и раз в `SEARCH_COMMENTS_INDEX_INTERVAL`
+    секунд каждый переиндексируется один раз, сколько бы комментариев
+    к нему ни пришло. С `TASKS_EAGER` пост индексируется сразу.
+    """
+
+    def __init__(self, flush_interval):
+        super().__init__('search-index', flush_interval)
+        self.posts_ids = set()
+
+    def mark_stale(self, posts_ids):
+        if settings.TASKS_EAGER:
+            update_search_index(posts_ids)
+            return
+        with self.lock:
+            self.posts_ids.update(posts_ids)
+        self.ensure_started()
+
+    def write_pending(self):
+        with self.lock:
+            posts_ids, self.posts_ids = list(self.posts_ids), set()
+        for start in range(0, len(posts_ids), SEARCH_INDEX_BATCH_SIZE):
+            batch = posts_ids[start:start + SEARCH_INDEX_BATCH_SIZE]
+            try:
+                with transaction.atomic():
+                    update_search_index(batch)
+            except Exception:
+                logger.exception(
+                    'Не удалось переиндексировать %s постов', len(batch))
+                with self.lock:
+                    self.posts_ids.update(batch)
+
+
+stale_posts_indexer = StalePostsIndexer(
+    flush_interval=settings.SEARCH_COMMENTS_INDEX_INTERVAL)
+
+
+def remove_from_search_index(posts_ids):
+    connection = get_search_connection()
+    if connection is None or not posts_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(posts_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+            list(posts_ids),
+        )
+
+
+def rebuild_search_index(batch_size=1000):
+    """Переиндексирует все посты, не закрывая поиск на время работы.
+
+    Посты перезаписываются в индексе пачками в отдельных транзакциях,
+    поэтому писатели не ждут окончания, а поиск продолжает находить
+    старые версии постов. Возвращает число проиндексированных постов.
+    """
+    connection = get_search_connection()
+    if connection is None:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid NOT IN '
+            f'(SELECT id FROM {Post._meta.db_table})'
+        )
+    indexed = 0
+    last_id = 0
+    while True:
+        posts_ids = list(
+            Post.objects.using(connection.alias)
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not posts_ids:
+            break
+        with transaction.atomic(using=connection.alias):
+            update_search_index(posts_ids)
+        indexed += len(posts_ids)
+        last_id = posts_ids[-1]
+
+    with connection.cursor() as cursor:
+        # склеивает сегменты индекса, чтобы поиск читал меньше страниц
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('optimize')")
+    return indexed
@@ -0,0 +1,138 @@
+from operator import attrgetter
+from typing import Callable, NamedTuple
+
+from blog.likes import likes_buffer
+from blog.renditions import get_post_image_srcsets
+
+
+class SerializedField(NamedTuple):
+    columns: tuple
+    get_value: Callable
+
+
+def get_likes_amount(post):
+    # лайки из буфера видны сразу, до того как попадут в базу
+    return post.likes_count + likes_buffer.get_pending_delta(post.id)
+
+
+def get_author_username(instance):
+    return instance.author.username
+
+
+def get_image_url(post):
+    return post.image.url if post.image else None
+
+
+def get_image_srcsets(post):
+    return get_post_image_srcsets(post.image_hash)
+
+
+def serialize_post_tags(post):
+    return [serialize_tag(tag) for tag in post.tags.all()]
+
+
+def get_first_tag_title(post):
+    return post.tags.all()[0].title
+
+
+def get_first_tag_slug(post):
+    return post.tags.all()[0].slug
+
+
+# поля, которые можно запросить у поста, и колонки, которые для них
+# нужно прочитать из базы; теги подгружаются отдельным запросом.
+# Карточки читают готовый анонс, а не весь текст поста
+POST_FIELDS = {
+    'title': SerializedField(('title',), attrgetter('title')),
+    'teaser_text': SerializedField(('teaser',), attrgetter('teaser')),
+    'text': SerializedField(('text',), attrgetter('text')),
+    'text_html': SerializedField(('text_html',), attrgetter('text_html')),
+    'author': SerializedField(('author__username',), get_author_username),
+    'comments_amount': SerializedField(
+        ('comments_count',), attrgetter('comments_count')),
+    'likes_amount': SerializedField(('likes_count',), get_likes_amount),
+    'image_url': SerializedField(('image',), get_image_url),
+    'image_srcsets': SerializedField(('image_hash',), get_image_srcsets),
+    'published_at': SerializedField(
+        ('published_at',), attrgetter('published_at')),
+    'slug': SerializedField(('slug',), attrgetter('slug')),
+    'tags': SerializedField((), serialize_post_tags),
+    'first_tag_title': SerializedField((), get_first_tag_title),
+    'first_tag_slug': SerializedField((), get_first_tag_slug),
+}
+POST_CARD_FIELDS = [
+    'title', 'teaser_text', 'author', 'comments_amount', 'image_url',
+    'image_srcsets', 'published_at', 'slug', 'tags', 'first_tag_title',
+    'first_tag_slug',
+]
+POST_TAGS_FIELDS = {'tags', 'first_tag_title', 'first_tag_slug'}
+
+TAG_FIELDS = {
+    'title': SerializedField(('title',), attrgetter('title')),
+    'slug': SerializedField(('slug',), attrgetter('slug')),
+    'posts_with_tag': SerializedField((), attrgetter('posts_count')),
+}
+
+COMMENT_FIELDS = {
+    'text': SerializedField(('text',), attrgetter('text')),
+    'published_at': SerializedField(
+        ('published_at',), attrgetter('published_at')),
+    'author': SerializedField(('author__username',), get_author_username),
+}
+
+
+def select_fields(queryset, fields, available_fields):
+    """Ограничивает запрос колонками, которые нужны полям `fields`.
+
+    Остальные колонки не читаются вовсе, а автор присоединяется, только
+    если его запросили.
+    """
+    columns = {'id'}
+    for field in fields:
+        columns.update(available_fields[field].columns)
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+    return queryset.only(*columns)
+
+
+def select_post_fields(posts, fields=POST_CARD_FIELDS):
+    """Готовит запрос постов под поля карточек, общий для HTML и API.
+
+    `published_at` читается всегда: по нему строятся курсоры страниц.
+    """
+    posts = select_fields(posts, ['published_at', *fields], POST_FIELDS)
+    if POST_TAGS_FIELDS.intersection(fields):
+        posts = posts.prefetch_tags()
+    return posts
+
+
+def select_comment_fields(comments, fields=COMMENT_FIELDS):
+    return select_fields(
+        comments, ['published_at', *fields], COMMENT_FIELDS)
+
+
+def serialize_fields(instance, fields, available_fields):
+    return {
+        field: available_fields[field].get_value(instance)
+        for field in fields
+    }
+
+
+def serialize_post(post, fields=POST_CARD_FIELDS):
+    return serialize_fields(post, fields, POST_FIELDS)
+
+
+def serialize_post_link(post):
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        'published_at': post.published_at,
+    }
+
+
+def serialize_tag(tag, fields=TAG_FIELDS):
+    return serialize_fields(tag, fields, TAG_FIELDS)
+
+
+def serialize_comment(comment, fields=COMMENT_FIELDS):
+    return serialize_fields(comment, fields, COMMENT_FIELDS)
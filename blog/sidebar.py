@@ -0,0 +1,54 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from blog.models import Tag
+from blog.serializers import serialize_tag
+
+
+POPULAR_TAGS_CACHE_KEY = 'sidebar:popular_tags:slugs'
+POPULAR_TAGS_AMOUNT = 5
+
+cache_stats = Counter(hits=0, misses=0)
+
+
+def get_popular_tags():
+    """Отдаёт сериализованные популярные теги для сайдбара.
+
+    Список одинаков на всех страницах, поэтому считается одним
+    агрегирующим запросом и кладётся в кэш на
+    `SIDEBAR_CACHE_TIMEOUT` секунд. При изменении тегов у постов
+    кэш сбрасывается сигналом, см. `invalidate_popular_tags`.
+    """
+    popular_tags = cache.get(POPULAR_TAGS_CACHE_KEY)
+    if popular_tags is not None:
+        cache_stats['hits'] += 1
+        return popular_tags
+
+    cache_stats['misses'] += 1
+    popular_tags = [
+        serialize_tag(tag)
+        for tag in Tag.objects.popular()[:POPULAR_TAGS_AMOUNT]
+    ]
+    cache.set(
+        POPULAR_TAGS_CACHE_KEY,
+        popular_tags,
+        settings.SIDEBAR_CACHE_TIMEOUT,
+    )
+    return popular_tags
+
+
+def invalidate_popular_tags():
+    cache.delete(POPULAR_TAGS_CACHE_KEY)
+
+
+def get_cache_stats():
+    """Счётчики попаданий в кэш сайдбара в текущем процессе."""
+    requests_count = cache_stats['hits'] + cache_stats['misses']
+    return {
+        'hits': cache_stats['hits'],
+        'misses': cache_stats['misses'],
+        'hit_ratio': (
+            cache_stats['hits'] / requests_count if requests_count else None),
+    }
@@ -0,0 +1,306 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from blog.archive import change_archive_counts, get_month
+from blog.models import Avatar, Comment, Post, PostTag, Tag
+from blog.page_cache import (
+    FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE, bump_versions,
+    get_post_scope, get_tag_scope)
+from blog.related import refresh_related_posts
+from blog.renditions import (
+    schedule_avatar_renditions, schedule_post_renditions)
+from blog.search import (
+    remove_from_search_index, stale_posts_indexer, update_search_index)
+from blog.sidebar import invalidate_popular_tags
+from blog.slug_cache import post_ids_by_slug
+from blog.tasks import task_queue
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # после clear() уже не узнать, какие посты лайкал пользователь
+        instance._cleared_liked_posts_ids = list(
+            instance.liked_posts.values_list('id', flat=True))
+        return
+
+    if action == 'post_add':
+        # в post_add Django передаёт только реально добавленные id
+        if reverse:
+            Post.objects.filter(pk__in=pk_set).update(
+                likes_count=F('likes_count') + 1, trending_stale=True)
+        else:
+            Post.objects.filter(pk=instance.pk).update(
+                likes_count=F('likes_count') + len(pk_set),
+                trending_stale=True,
+            )
+    elif action == 'post_remove':
+        # в post_remove pk_set может содержать несуществующие лайки,
+        # поэтому счётчик пересчитывается, а не уменьшается на len(pk_set)
+        posts_ids = pk_set if reverse else [instance.pk]
+        Post.objects.filter(pk__in=posts_ids).recount_counters()
+    elif action == 'post_clear':
+        if reverse:
+            posts_ids = instance.__dict__.pop('_cleared_liked_posts_ids', [])
+            Post.objects.filter(pk__in=posts_ids).recount_counters()
+        else:
+            Post.objects.filter(pk=instance.pk).update(
+                likes_count=0, trending_stale=True)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def reset_popular_tags_on_tags_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_popular_tags()
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_popular_tags(sender, **kwargs):
+    invalidate_popular_tags()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def fill_tags_published_at(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    # tags.add() создаёт связи без даты публикации поста
+    if action != 'post_add':
+        return
+    if reverse:
+        PostTag.objects.filter(
+            tag=instance, post_id__in=pk_set).fill_published_at()
+    else:
+        PostTag.objects.filter(post=instance, tag_id__in=pk_set).update(
+            published_at=instance.published_at)
+
+
+@receiver(post_save, sender=Post)
+def update_tags_published_at(sender, instance, created, **kwargs):
+    if not created:
+        PostTag.objects.filter(post=instance).exclude(
+            published_at=instance.published_at,
+        ).update(published_at=instance.published_at)
+
+
+def get_post_scopes(posts):
+    """Области кэша страниц, которые показывают эти посты целиком."""
+    scopes = set()
+    for slug, tag_slug in posts.values_list('slug', 'tags__slug'):
+        scopes.add(get_post_scope(slug))
+        if tag_slug:
+            scopes.add(get_tag_scope(tag_slug))
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def mark_trending_stale(sender, instance, **kwargs):
+    # рейтинг зависит от даты публикации, которую могли поменять в админке
+    instance.trending_stale = True
+
+
+@receiver(pre_save, sender=Post)
+def render_post_text(sender, instance, **kwargs):
+    instance.render_text()
+
+
+@receiver(pre_save, sender=Post)
+def remember_archive_month(sender, instance, **kwargs):
+    # дату публикации могли поменять, и пост переедет в другой месяц
+    old_published_at = None
+    if instance.pk is not None:
+        old_published_at = Post.objects.filter(pk=instance.pk).values_list(
+            'published_at', flat=True).first()
+    instance._archive_month = (
+        get_month(old_published_at) if old_published_at else None)
+
+
+@receiver(post_save, sender=Post)
+def update_archive_on_save(sender, instance, **kwargs):
+    old_month = instance.__dict__.pop('_archive_month', None)
+    new_month = get_month(instance.published_at)
+    if old_month != new_month:
+        deltas = Counter({new_month: 1})
+        if old_month:
+            deltas[old_month] -= 1
+        change_archive_counts(deltas)
+
+
+@receiver(post_delete, sender=Post)
+def update_archive_on_delete(sender, instance, **kwargs):
+    change_archive_counts({get_month(instance.published_at): -1})
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_post_slug(sender, instance, **kwargs):
+    post_ids_by_slug.forget(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_versions(sender, instance, **kwargs):
+    scopes = get_post_scopes(Post.objects.filter(pk=instance.pk))
+    bump_versions(FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE, *scopes)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_scopes(sender, instance, **kwargs):
+    instance._cache_scopes = get_post_scopes(
+        Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_versions(sender, instance, **kwargs):
+    scopes = instance.__dict__.pop('_cache_scopes', set())
+    bump_versions(FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE, *scopes)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tag_versions(sender, instance, **kwargs):
+    posts_slugs = instance.posts.values_list('slug', flat=True)
+    bump_versions(
+        FEED_SCOPE,
+        SIDEBAR_SCOPE,
+        SYNDICATION_SCOPE,
+        get_tag_scope(instance.slug),
+        *(get_post_scope(slug) for slug in posts_slugs),
+    )
+
+
+@task_queue.task
+def apply_comments_changes(changes):
+    """Обновляет всё, что зависит от комментариев, сразу для пачки.
+
+    `changes` — пары `(post_id, delta)`, где `delta` — на сколько
+    изменилось число комментариев поста. Счётчик меняется одним UPDATE на
+    пост, кэш страниц сбрасывается одним вызовом, а поисковый индекс
+    переиндексирует каждый пост один раз за интервал, см.
+    `StalePostsIndexer`.
+    """
+    deltas = Counter()
+    for post_id, delta in changes:
+        deltas[post_id] += delta
+    for post_id, delta in deltas.items():
+        if delta:
+            Post.objects.filter(pk=post_id).update(
+                comments_count=Greatest(F('comments_count') + delta, 0),
+                trending_stale=True,
+            )
+
+    # комментарий меняет только страницу поста, ленты его тегов и главную
+    scopes = get_post_scopes(Post.objects.filter(pk__in=deltas))
+    bump_versions(FEED_SCOPE, *scopes)
+    if settings.SEARCH_INCLUDE_COMMENTS:
+        stale_posts_indexer.mark_stale(list(deltas))
+
+
+@receiver(post_save, sender=Comment)
+def defer_comment_save(sender, instance, created, **kwargs):
+    # запрос, добавивший комментарий, не ждёт пересчётов и сброса кэша
+    change = (instance.post_id, 1 if created else 0)
+    transaction.on_commit(lambda: apply_comments_changes.defer(change))
+
+
+@receiver(post_delete, sender=Comment)
+def defer_comment_delete(sender, instance, **kwargs):
+    change = (instance.post_id, -1)
+    transaction.on_commit(lambda: apply_comments_changes.defer(change))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def bump_tags_change_versions(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    # до изменения собираем старые связи, после — новые
+    if reverse:
+        posts = instance.posts.all()
+        if pk_set:
+            posts = Post.objects.filter(pk__in=pk_set)
+        scopes = get_post_scopes(posts) | {get_tag_scope(instance.slug)}
+    else:
+        scopes = get_post_scopes(Post.objects.filter(pk=instance.pk))
+        if pk_set:
+            scopes.update(
+                get_tag_scope(slug) for slug in
+                Tag.objects.filter(pk__in=pk_set).values_list(
+                    'slug', flat=True)
+            )
+
+    if action.startswith('pre_'):
+        instance._cache_scopes = scopes
+    else:
+        scopes |= instance.__dict__.pop('_cache_scopes', set())
+        bump_versions(FEED_SCOPE, SIDEBAR_SCOPE, SYNDICATION_SCOPE, *scopes)
+
+
+@task_queue.task
+def refresh_posts_related(posts_ids):
+    posts_ids = set(posts_ids)
+    refresh_related_posts(posts_ids)
+    slugs = Post.objects.filter(pk__in=posts_ids).values_list(
+        'slug', flat=True)
+    bump_versions(*(get_post_scope(slug) for slug in slugs))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def defer_related_posts_refresh(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    posts_ids = (pk_set or []) if reverse else [instance.pk]
+    for post_id in posts_ids:
+        transaction.on_commit(
+            lambda post_id=post_id: refresh_posts_related.defer(post_id))
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def bump_likes_change_versions(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'pre_clear':
+        if reverse:
+            instance._liked_posts_slugs = list(
+                instance.liked_posts.values_list('slug', flat=True))
+        return
+
+    if not reverse:
+        slugs = [instance.slug]
+    elif action == 'post_clear':
+        slugs = instance.__dict__.pop('_liked_posts_slugs', [])
+    else:
+        slugs = Post.objects.filter(pk__in=pk_set).values_list(
+            'slug', flat=True)
+    # популярные посты в сайдбаре меняет только пересчёт рейтинга
+    bump_versions(*(get_post_scope(slug) for slug in slugs))
+
+
+@receiver(post_save, sender=Post)
+def build_post_renditions(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(
+            lambda: schedule_post_renditions(instance.pk))
+
+
+@receiver(post_save, sender=Avatar)
+def build_avatar_renditions(sender, instance, **kwargs):
+    if instance.original_image:
+        transaction.on_commit(
+            lambda: schedule_avatar_renditions(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.shortcuts import aget_object_or_404, get_object_or_404
+
+
+class SlugCache:
+    """Ограниченный LRU-кэш «слаг → id» в памяти процесса.
+
+    Страница поста ищет его по слагу, то есть сначала по индексу слагов
+    и уже потом по первичному ключу. Для популярных постов id берётся
+    отсюда, и запрос идёт сразу по первичному ключу. Записи вытесняются
+    давно не запрошенные, а при сохранении и удалении поста в этом
+    процессе запись о нём забывается.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.ids = OrderedDict()
+        self.slugs = {}
+
+    def get(self, slug):
+        with self.lock:
+            object_id = self.ids.get(slug)
+            if object_id is not None:
+                self.ids.move_to_end(slug)
+            return object_id
+
+    def set(self, slug, object_id):
+        with self.lock:
+            old_slug = self.slugs.get(object_id)
+            if old_slug is not None:
+                self.ids.pop(old_slug, None)
+            self.ids[slug] = object_id
+            self.slugs[object_id] = slug
+            while len(self.ids) > self.max_size:
+                _, evicted_id = self.ids.popitem(last=False)
+                self.slugs.pop(evicted_id, None)
+
+    def forget(self, object_id):
+        with self.lock:
+            slug = self.slugs.pop(object_id, None)
+            if slug is not None:
+                self.ids.pop(slug, None)
+
+
+post_ids_by_slug = SlugCache(settings.POST_SLUG_CACHE_SIZE)
+
+
+def get_post_or_404(posts, slug):
+    """Отдаёт пост по слагу, по возможности через первичный ключ.
+
+    Слаг сверяется и при поиске по ключу: другой процесс мог поменять
+    слаг или удалить пост, и тогда запись кэша просто забывается.
+    """
+    post_id = post_ids_by_slug.get(slug)
+    if post_id is not None:
+        post = posts.filter(pk=post_id, slug=slug).first()
+        if post is not None:
+            return post
+        post_ids_by_slug.forget(post_id)
+    post = get_object_or_404(posts, slug=slug)
+    post_ids_by_slug.set(slug, post.pk)
+    return post
+
+
+async def aget_post_or_404(posts, slug):
+    post_id = post_ids_by_slug.get(slug)
+    if post_id is not None:
+        post = await posts.filter(pk=post_id, slug=slug).afirst()
+        if post is not None:
+            return post
+        post_ids_by_slug.forget(post_id)
+    post = await aget_object_or_404(posts, slug=slug)
+    post_ids_by_slug.set(slug, post.pk)
+    return post
@@ -0,0 +1,216 @@
+import hashlib
+import inspect
+import json
+import os
+from collections import defaultdict
+from typing import NamedTuple
+from urllib.parse import unquote, urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from blog.archive import get_month
+from blog.models import ArchiveMonth, Post, RelatedPost, Tag
+from blog.pagination import (
+    ARCHIVE_POSTS_PER_PAGE, POSTS_PER_PAGE, TAG_POSTS_PER_PAGE, encode_cursor)
+from blog.related import RELATED_POSTS_AMOUNT
+from blog.sidebar import POPULAR_TAGS_AMOUNT
+from blog.trending import TRENDING_POSTS_AMOUNT
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+class StaticPage(NamedTuple):
+    url: str
+    filename: str
+    fingerprint: str
+
+
+def get_page_filename(url):
+    """Путь файла страницы внутри выгрузки.
+
+    `/post/slug` превращается в `post/slug.html`, адреса со слешем на
+    конце — в `index.html` внутри папки. Такую раскладку веб-сервер
+    отдаёт по исходным адресам через `try_files`, поэтому ссылки из
+    шаблонов и `get_absolute_url` работают без переписывания.
+    """
+    path = unquote(urlsplit(url).path).lstrip('/')
+    if not path or path.endswith('/'):
+        return f'{path}index.html'
+    return f'{path}.html'
+
+
+def make_fingerprint(*parts):
+    raw = json.dumps(parts, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_templates_fingerprint():
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(settings.TEMPLATE_DIR):
+        dirs.sort()
+        for filename in sorted(files):
+            with open(os.path.join(root, filename), 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def group_by_post(rows):
+    grouped = defaultdict(list)
+    for post_id, value in rows:
+        grouped[post_id].append(value)
+    return grouped
+
+
+def collect_pages():
+    """Перечисляет страницы сайта вместе с отпечатками их содержимого.
+
+    Отпечаток собирается из всего, что видно на странице: полей постов,
+    счётчиков, тегов, похожих постов и общих для всех страниц блоков
+    сайдбара и шаблонов. Совпал отпечаток с прошлой сборкой — страницу
+    можно не рендерить. Правка текста комментария без изменения их
+    числа отпечаток не меняет, такие страницы обновит `--full`.
+    """
+    posts = list(
+        Post.objects.order_by('-published_at', '-id').values_list(
+            'id', 'slug', 'title', 'published_at', 'updated_at',
+            'comments_count', 'likes_count', 'author__username',
+            named=True,
+        ).iterator(chunk_size=10000)
+    )
+    posts_tags = group_by_post(
+        (post_id, (tag_title, tag_slug))
+        for post_id, tag_title, tag_slug in
+        Post.tags.through.objects.values_list(
+            'post_id', 'tag__title', 'tag__slug').iterator(chunk_size=10000)
+    )
+    related_posts = group_by_post(
+        RelatedPost.objects.order_by('post_id', '-score')
+        .values_list('post_id', 'related_id')
+        .iterator(chunk_size=10000)
+    )
+    cards = {
+        post.id: make_fingerprint(
+            post.slug, post.title, post.published_at, post.updated_at,
+            post.comments_count, post.author__username,
+            sorted(posts_tags[post.id]),
+        )
+        for post in posts
+    }
+    trending_ids = Post.objects.trending().values_list(
+        'id', flat=True)[:TRENDING_POSTS_AMOUNT]
+    shared = make_fingerprint(
+        get_templates_fingerprint(),
+        settings.STATIC_URL,
+        list(
+            Tag.objects.popular()[:POPULAR_TAGS_AMOUNT]
+            .values_list('title', 'posts_count')
+        ),
+        [cards[post_id] for post_id in trending_ids if post_id in cards],
+        list(ArchiveMonth.objects.values_list('month', 'posts_count')),
+    )
+
+    contacts_url = reverse('contacts')
+    yield StaticPage(contacts_url, get_page_filename(contacts_url), shared)
+
+    for number, start in enumerate(
+            range(0, max(len(posts), 1), POSTS_PER_PAGE), start=1):
+        page_posts = posts[start:start + POSTS_PER_PAGE]
+        fingerprint = make_fingerprint(
+            shared, number, [cards[post.id] for post in page_posts],
+            start + POSTS_PER_PAGE < len(posts),
+        )
+        url = reverse('index', args=[number])
+        if start:
+            cursor = encode_cursor(posts[start - 1])
+            url = f"{url}?{urlencode({'after': cursor})}"
+        else:
+            yield StaticPage(reverse('index'), 'index.html', fingerprint)
+        yield StaticPage(url, get_page_filename(url), fingerprint)
+
+    tags_posts = defaultdict(list)
+    for post in posts:
+        for _, tag_slug in posts_tags[post.id]:
+            tags_posts[tag_slug].append(post.id)
+    for tag_slug, tag_posts_ids in tags_posts.items():
+        # следующие страницы тега и месяца отдаёт Django, см. README
+        url = reverse('tag_filter', args=[tag_slug])
+        fingerprint = make_fingerprint(
+            shared,
+            [cards[post_id] for post_id in
+             tag_posts_ids[:TAG_POSTS_PER_PAGE]],
+            len(tag_posts_ids) > TAG_POSTS_PER_PAGE,
+        )
+        yield StaticPage(url, get_page_filename(url), fingerprint)
+
+    months_posts = defaultdict(list)
+    for post in posts:
+        months_posts[get_month(post.published_at)].append(post.id)
+    for month, month_posts_ids in months_posts.items():
+        url = reverse('archive', args=[month.year, month.month])
+        fingerprint = make_fingerprint(
+            shared,
+            [cards[post_id] for post_id in
+             month_posts_ids[:ARCHIVE_POSTS_PER_PAGE]],
+            len(month_posts_ids) > ARCHIVE_POSTS_PER_PAGE,
+        )
+        yield StaticPage(url, get_page_filename(url), fingerprint)
+
+    for post in posts:
+        url = reverse('post_detail', args=[post.slug])
+        fingerprint = make_fingerprint(
+            shared, cards[post.id], post.likes_count,
+            [cards.get(related_id) for related_id in
+             related_posts[post.id][:RELATED_POSTS_AMOUNT]],
+        )
+        yield StaticPage(url, get_page_filename(url), fingerprint)
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+
+def render_pages(pages, output_dir):
+    """Рендерит страницы в файлы, вызывается в процессах пула.
+
+    Вьюхи зовутся напрямую, в обход кэша страниц и роутера реплик:
+    выгрузка и так читает каждую страницу один раз, а кэш только
+    заполнился бы страницами, которые никто не запросит.
+    """
+    factory = RequestFactory()
+    for url, filename in pages:
+        match = resolve(unquote(urlsplit(url).path))
+        request = factory.get(url)
+        request.user = AnonymousUser()
+        view = inspect.unwrap(match.func)
+        response = view(request, *match.args, **match.kwargs)
+        write_file(os.path.join(output_dir, filename), response.content)
+    return len(pages)
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    content = json.dumps(manifest, ensure_ascii=False, sort_keys=True)
+    write_file(os.path.join(output_dir, MANIFEST_FILENAME), content.encode())
+
+
+def remove_stale_files(output_dir, filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(output_dir, filename))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,52 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalCompressedManifestStorage(
+        CompressedManifestStaticFilesStorage):
+    """Статика с хэшем содержимого в именах и сжатыми копиями gzip и brotli.
+
+    Сжимаются только файлы с хэшем в имени: на них ссылаются шаблоны,
+    а раз имя зависит от содержимого, лежащая рядом сжатая копия всегда
+    актуальна. Поэтому повторный collectstatic сжимает только новые
+    и изменившиеся файлы, а не всю статику заново.
+
+    Файлы, которых нет в манифесте, отдаются под исходными именами,
+    а не роняют страницу: до первого collectstatic, например в тестах
+    и при локальном запуске с `DEBUG=false`, манифеста нет вовсе.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def compress_files(self, paths):
+        hashed_names = set(self.hashed_files.values())
+        changed_paths = [
+            path for path in paths
+            if path in hashed_names and not self.exists(f'{path}.gz')
+        ]
+        return super().compress_files(changed_paths)
+
+    def url_converter(self, name, hashed_files, template=None):
+        convert_url = super().url_converter(name, hashed_files, template)
+
+        def convert_url_keeping_missing(matchobj):
+            try:
+                return convert_url(matchobj)
+            except (ValueError, SuspiciousFileOperation):
+                # в CSS темы есть ссылки на файлы, которых нет в репозитории
+                logger.warning(
+                    '%s ссылается на несуществующий файл %s',
+                    name, matchobj['url'])
+                return matchobj['matched']
+        return convert_url_keeping_missing
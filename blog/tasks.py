@@ -0,0 +1,148 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Фоновый поток процесса, который копит работу и сбрасывает её пачкой.
+
+    Поток запускается при первой работе, вызовом `ensure_started`, и
+    вызывает `flush` раз в `flush_interval` секунд или сразу после
+    `wake_up`, а без интервала спит до `wake_up`. При штатной остановке
+    процесса `flush` дорабатывает накопленное через `atexit`, а при
+    аварийной оно теряется. Подкласс пишет накопленное в
+    `write_pending`, которое не вызывается из двух потоков сразу.
+    Ошибка записи пишется в лог, а поток продолжает работать; если он
+    всё же умер, `ensure_started` запустит новый.
+    """
+
+    def __init__(self, thread_name, flush_interval=None):
+        self.thread_name = thread_name
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def write_pending(self):
+        raise NotImplementedError
+
+    def flush(self):
+        with self.flush_lock:
+            self.write_pending()
+
+    def wake_up(self):
+        self.ensure_started()
+        self.wakeup.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def ensure_started(self):
+        if self.is_running():
+            return
+        with self.lock:
+            if self.is_running():
+                return
+            first_start = self.thread is None
+            self.thread = threading.Thread(
+                target=self.run, name=self.thread_name, daemon=True)
+            self.thread.start()
+        if first_start:
+            atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # поток общий на весь процесс: упавшая запись не должна
+                # остановить следующие
+                logger.exception(
+                    'Поток %s не смог записать накопленное', self.thread_name)
+            finally:
+                close_old_connections()
+
+
+class BatchTask:
+    """Фоновая задача, которая обрабатывает накопленные вызовы пачкой.
+
+    Обёрнутая функция получает список аргументов всех вызовов `defer`,
+    собранных очередью за один проход.
+    """
+
+    def __init__(self, func, task_queue):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.task_queue = task_queue
+
+    def __call__(self, payloads):
+        return self.func(payloads)
+
+    def defer(self, payload):
+        self.task_queue.put(self, payload)
+
+
+class TaskQueue(BackgroundWorker):
+    """Локальная очередь задач в потоке процесса.
+
+    Поток просыпается на первую задачу, разбирает всё, что успело
+    накопиться, пачками по `batch_size` и вызывает каждую задачу один
+    раз со списком её аргументов. Так сотня комментариев к одному посту
+    превращается в один UPDATE счётчика. Очередь живёт в памяти и, как
+    всякий `BackgroundWorker`, дорабатывается при штатной остановке
+    процесса. С `TASKS_EAGER` задача выполняется сразу, в потоке
+    вызывающего кода.
+    """
+
+    def __init__(self, batch_size):
+        super().__init__(thread_name='tasks')
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+
+    def task(self, func):
+        return BatchTask(func, self)
+
+    def put(self, task, payload):
+        if settings.TASKS_EAGER:
+            self.process([(task, payload)])
+            return
+        self.queue.put((task, payload))
+        self.wake_up()
+
+    def get_ready_items(self):
+        items = []
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def write_pending(self):
+        while items := self.get_ready_items():
+            self.process(items)
+
+    def process(self, items):
+        payloads_by_task = defaultdict(list)
+        for task, payload in items:
+            payloads_by_task[task].append(payload)
+        for task, payloads in payloads_by_task.items():
+            try:
+                task(payloads)
+            except Exception:
+                logger.exception(
+                    'Задача %s упала на %s вызовах', task.name, len(payloads))
+
+
+task_queue = TaskQueue(batch_size=settings.TASKS_BATCH_SIZE)
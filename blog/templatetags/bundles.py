@@ -0,0 +1,23 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from blog.bundles import get_bundle_name
+
+
+register = template.Library()
+
+CSS_TAG = '<link rel="stylesheet" href="{}">'
+JS_TAG = '<script src="{}"></script>'
+
+
+@register.simple_tag
+def bundle(name):
+    """Подключает бандл или, если бандлы выключены, его файлы по одному."""
+    if settings.STATIC_BUNDLES_ENABLED:
+        names = [get_bundle_name(name)]
+    else:
+        names = settings.STATIC_BUNDLES[name]
+    tag = CSS_TAG if name.endswith('.css') else JS_TAG
+    return format_html_join('\n', tag, ((static(name),) for name in names))
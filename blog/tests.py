@@ -0,0 +1,371 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.utils import timezone
+
+from blog.models import Comment, Post, PostTag, Tag
+from blog.likes import LikesBuffer
+from blog.pagination import paginate_tag_posts
+from blog.search import StalePostsIndexer
+from blog.tasks import BackgroundWorker
+
+
+def create_blog():
+    """Автор, два тега и три поста с комментариями — хватает всем view."""
+    author = User.objects.create_user('author', password='password')
+    tags = [Tag.objects.create(title=title) for title in ('python', 'django')]
+    posts = []
+    for number in range(3):
+        post = Post.objects.create(
+            title=f'Пост {number}',
+            text=f'Текст поста номер {number}',
+            slug=f'post-{number}',
+            published_at=timezone.now() - timedelta(days=number),
+            author=author,
+        )
+        post.tags.set(tags)
+        Comment.objects.create(
+            post=post,
+            author=author,
+            text='Комментарий',
+            published_at=timezone.now(),
+        )
+        posts.append(post)
+    return author, tags, posts
+
+
+class FailingWorker(BackgroundWorker):
+    """Падает на первой записи и отмечает каждую следующую."""
+
+    def __init__(self):
+        super().__init__('failing-worker')
+        self.attempts = 0
+        self.written = threading.Event()
+
+    def write_pending(self):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise RuntimeError('database is locked')
+        self.written.set()
+
+
+class BackgroundWorkerTests(SimpleTestCase):
+
+    def test_worker_survives_failed_write(self):
+        worker = FailingWorker()
+
+        with self.assertLogs('blog.tasks', 'ERROR'):
+            worker.wake_up()
+            while worker.attempts < 1:
+                time.sleep(0.01)
+        worker.wake_up()
+
+        self.assertTrue(worker.written.wait(5))
+        self.assertTrue(worker.thread.is_alive())
+
+    def test_dead_thread_is_restarted(self):
+        worker = FailingWorker()
+        worker.thread = threading.Thread(target=lambda: None)
+        worker.thread.start()
+        worker.thread.join()
+
+        worker.ensure_started()
+
+        self.assertTrue(worker.thread.is_alive())
+
+
+@override_settings(TASKS_EAGER=True)
+class LikesBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags, cls.posts = create_blog()
+
+    def test_likes_are_kept_when_cache_bump_fails(self):
+        likes_buffer = LikesBuffer(
+            flush_interval=None, max_size=100, batch_size=100)
+        post = self.posts[0]
+        likes_buffer.set_liked(post.id, self.author.id, True)
+
+        with mock.patch(
+                'blog.likes.bump_versions', side_effect=OSError('cache')):
+            with self.assertLogs('blog.likes', 'ERROR'):
+                likes_buffer.flush()
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertTrue(post.likes.filter(pk=self.author.pk).exists())
+        self.assertEqual(likes_buffer.pending, {})
+
+
+@override_settings(TASKS_EAGER=False)
+class StalePostsIndexerTests(TestCase):
+
+    def test_post_is_indexed_once_per_flush(self):
+        indexer = StalePostsIndexer(flush_interval=None)
+
+        with mock.patch('blog.search.update_search_index') as update_index:
+            indexer.mark_stale([1, 2])
+            indexer.mark_stale([2])
+            self.assertFalse(update_index.called)
+            indexer.flush()
+
+        update_index.assert_called_once()
+        self.assertEqual(sorted(update_index.call_args.args[0]), [1, 2])
+        self.assertEqual(indexer.posts_ids, set())
+
+
+@override_settings(TASKS_EAGER=True)
+class TagSlugTests(TestCase):
+
+    def test_slug_from_title(self):
+        self.assertEqual(Tag.objects.create(title='python').slug, 'python')
+
+    def test_empty_slug_is_replaced(self):
+        first_tag = Tag.objects.create(title='!!!')
+        second_tag = Tag.objects.create(title='???')
+
+        self.assertEqual(first_tag.slug, 'tag')
+        self.assertEqual(second_tag.slug, 'tag-2')
+
+    def test_same_slugs_get_numbers(self):
+        slugs = [
+            Tag.objects.create(title=title).slug
+            for title in ('c', 'c++', 'c#')
+        ]
+
+        self.assertEqual(slugs, ['c', 'c-2', 'c-3'])
+
+    def test_slug_is_kept_on_save(self):
+        tag = Tag.objects.create(title='c')
+        tag.save()
+
+        self.assertEqual(tag.slug, 'c')
+
+
+@override_settings(TASKS_EAGER=True)
+class PostTagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags, cls.posts = create_blog()
+
+    def get_links_dates(self, post):
+        return set(
+            PostTag.objects.filter(post=post)
+            .values_list('published_at', flat=True)
+        )
+
+    def test_links_get_post_date(self):
+        tag = Tag.objects.create(title='новый')
+        self.posts[0].tags.add(tag)
+        tag.posts.add(self.posts[1])
+
+        self.assertEqual(
+            self.get_links_dates(self.posts[0]), {self.posts[0].published_at})
+        self.assertEqual(
+            self.get_links_dates(self.posts[1]), {self.posts[1].published_at})
+
+    def test_links_follow_post_date(self):
+        post = self.posts[0]
+        post.published_at -= timedelta(days=10)
+        post.save()
+
+        self.assertEqual(self.get_links_dates(post), {post.published_at})
+
+    def test_tag_posts_pages(self):
+        first_page = paginate_tag_posts(
+            Post.objects.all(), self.tags[0].id, per_page=2)
+        second_page = paginate_tag_posts(
+            Post.objects.all(), self.tags[0].id,
+            after=first_page.next_cursor, per_page=2)
+
+        self.assertEqual(first_page.objects, self.posts[:2])
+        self.assertEqual(second_page.objects, self.posts[2:])
+        self.assertIsNone(second_page.next_cursor)
+
+
+@override_settings(TASKS_EAGER=True, PAGE_VIEWS_URL_NAMES=[])
+class ViewsQueriesTests(TestCase):
+    # кэш очищается перед каждым тестом, поэтому считаются запросы
+    # страницы с холодным кэшем вместе с сайдбаром
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags, cls.posts = create_blog()
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_page_queries(self, url, queries_count):
+        with self.assertNumQueries(queries_count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_index(self):
+        self.assert_page_queries('/', 6)
+
+    def test_post_detail(self):
+        self.assert_page_queries('/post/post-0', 9)
+
+    def test_tag_filter(self):
+        self.assert_page_queries(f'/tag/{self.tags[0].slug}', 8)
+
+    def test_cached_page_for_anonymous(self):
+        self.client.get('/post/post-0')
+
+        self.assert_page_queries('/post/post-0', 0)
+
+    def test_index_for_logged_in_user(self):
+        self.client.force_login(self.author)
+
+        # сессия и пользователь — ещё два запроса
+        self.assert_page_queries('/', 8)
+
+    def test_post_detail_for_logged_in_user(self):
+        self.client.force_login(self.author)
+
+        # ещё один запрос узнаёт, лайкнул ли пользователь пост
+        self.assert_page_queries('/post/post-0', 12)
+
+    def test_post_detail_shows_like_of_user(self):
+        self.posts[0].likes.add(self.author)
+        self.client.force_login(self.author)
+
+        response = self.client.get('/post/post-0')
+
+        self.assertContains(response, 'data-liked="true"')
+
+    def test_tag_filter_for_logged_in_user(self):
+        self.client.force_login(self.author)
+
+        self.assert_page_queries(f'/tag/{self.tags[0].slug}', 10)
+
+
+@override_settings(TASKS_EAGER=True, PAGE_VIEWS_URL_NAMES=[])
+class ApiQueriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags, cls.posts = create_blog()
+        cls.endpoints = [
+            ('/api/v1/posts', 2),
+            ('/api/v1/posts/post-0', 2),
+            ('/api/v1/posts/post-0/comments', 2),
+            ('/api/v1/tags', 1),
+            (f'/api/v1/tags/{cls.tags[0].slug}/posts', 4),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_endpoints_queries(self, extra_queries=0):
+        for url, queries_count in self.endpoints:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries_count + extra_queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous(self):
+        self.assert_endpoints_queries()
+
+    def test_logged_in_user(self):
+        self.client.force_login(self.author)
+
+        # сессия и пользователь нужны, чтобы обойти кэш страниц
+        self.assert_endpoints_queries(extra_queries=2)
+
+    def test_anonymous_with_session(self):
+        session = self.client.session
+        session['seen'] = True
+        session.save()
+        self.client.cookies['sessionid'] = session.session_key
+
+        # в сессии нет пользователя, и его запрашивать не нужно
+        self.assert_endpoints_queries(extra_queries=1)
+
+    def test_unknown_fields(self):
+        response = self.client.get('/api/v1/posts?fields=title,password')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    @override_settings(
+        QUERY_INSTRUMENTATION=True, QUERY_INSTRUMENTATION_STRICT=True)
+    def test_budgets_for_logged_in_user(self):
+        # запросы сессии и пользователя не идут в лимит view
+        client = self.client_class()
+        client.force_login(self.author)
+        for url, _ in self.endpoints:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    TASKS_EAGER=True,
+    PAGE_VIEWS_URL_NAMES=[],
+    ALLOWED_HOSTS=['testserver', 'mirror.example.com'],
+)
+class FeedsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.tags, cls.posts = create_blog()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_is_cached_per_host(self):
+        self.client.get('/feed/rss').getvalue()
+
+        response = self.client.get('/feed/rss', HTTP_HOST='mirror.example.com')
+
+        self.assertIn(b'http://mirror.example.com/post/', response.getvalue())
+        self.assertNotIn(b'http://testserver/', response.getvalue())
+
+    def test_conditional_request_on_miss_fills_cache(self):
+        response = self.client.get(
+            '/feed/rss',
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/feed/rss')
+        self.assertIn(b'/post/post-0', response.content)
+
+
+@override_settings(
+    ROOT_URLCONF='sensive_blog.asgi_urls',
+    TASKS_EAGER=True,
+    PAGE_VIEWS_URL_NAMES=[],
+)
+class AsyncViewsTests(TransactionTestCase):
+    # async view читают базу из своих потоков, и данные теста должны быть
+    # закоммичены, а не висеть в транзакции TestCase
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.tags, self.posts = create_blog()
+
+    async def test_post_detail_for_anonymous(self):
+        response = await self.async_client.get('/post/post-0')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'comment-form')
+
+    async def test_post_detail_for_logged_in_user(self):
+        await self.async_client.aforce_login(self.author)
+
+        response = await self.async_client.get('/post/post-0')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'comment-form')
+        self.assertContains(response, 'data-liked="false"')
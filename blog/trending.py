@@ -0,0 +1,89 @@
+import math
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from blog.models import Post
+from blog.page_cache import SIDEBAR_SCOPE, bump_versions
+
+
+TRENDING_POSTS_AMOUNT = 5
+
+
+def get_trending_score(likes, comments, views, published_at):
+    """Считает рейтинг поста с затуханием от даты публикации.
+
+    Активность поста — взвешенная сумма лайков, комментариев и
+    просмотров — теряет половину веса каждые `TRENDING_HALF_LIFE_HOURS`
+    часов. Порядок постов по `activity * 2^(-(now - published_at) / T)`
+    совпадает с порядком по логарифму без слагаемого с `now`, поэтому
+    рейтинг не зависит от текущего времени и пересчитывается, только
+    когда у поста меняются лайки, комментарии или просмотры.
+    """
+    weights = settings.TRENDING_WEIGHTS
+    activity = (
+        likes * weights['likes']
+        + comments * weights['comments']
+        + views * weights['views']
+    )
+    decay_rate = math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 60 * 60)
+    return math.log1p(activity) + published_at.timestamp() * decay_rate
+
+
+def get_trending_posts_ids():
+    return list(
+        Post.objects.trending()
+        .values_list('id', flat=True)[:TRENDING_POSTS_AMOUNT]
+    )
+
+
+def update_trending_scores(batch_size):
+    """Пересчитывает рейтинг постов, помеченных `trending_stale`.
+
+    Пометку ставят те же UPDATE, что меняют счётчики, а строки пачки
+    блокируются до записи рейтинга, поэтому лайк, пришедший во время
+    пересчёта, снова пометит пост и не потеряется. Кэш сайдбара
+    сбрасывается, только если изменился сам список популярных постов.
+    Возвращает число пересчитанных постов.
+    """
+    trending_before = get_trending_posts_ids()
+    updated_count = 0
+    while True:
+        with transaction.atomic():
+            posts = list(
+                Post.objects
+                .select_for_update()
+                .filter(trending_stale=True)
+                .only(
+                    'likes_count', 'comments_count', 'views_count',
+                    'published_at')
+                .order_by('id')[:batch_size]
+            )
+            if not posts:
+                break
+            scores = [
+                (
+                    get_trending_score(
+                        post.likes_count,
+                        post.comments_count,
+                        post.views_count,
+                        post.published_at,
+                    ),
+                    post.id,
+                )
+                for post in posts
+            ]
+            # bulk_update строит CASE на каждую строку и на больших пачках
+            # тратит больше времени в Python, чем база на сами UPDATE
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'UPDATE {Post._meta.db_table} '
+                    f'SET trending_score = %s, trending_stale = FALSE '
+                    f'WHERE id = %s',
+                    scores,
+                )
+        updated_count += len(posts)
+
+    if get_trending_posts_ids() != trending_before:
+        bump_versions(SIDEBAR_SCOPE)
+    return updated_count
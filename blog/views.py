@@ -1,119 +1,390 @@
-from django.shortcuts import render
+import math
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
+from blog.archive import get_archive_months, get_month_range
+from blog.db import reads_from_replica
+from blog.forms import CommentForm
+from blog.likes import likes_buffer
+from blog.middleware import query_budget
 from blog.models import Comment, Post, Tag
+from blog.page_cache import (
+    FEED_SCOPE, RELATED_SCOPE, SIDEBAR_SCOPE, attach_cache_versions,
+    cache_page_by_versions, get_post_scope, get_tag_scope, get_versions)
+from blog.pagination import (
+    ARCHIVE_POSTS_PER_PAGE, paginate_by_keyset, paginate_comments,
+    paginate_tag_posts)
+from blog.ratelimit import get_client_ip, take_token
+from blog.renditions import get_post_image_srcsets
+from blog.search import search_posts
+from blog.related import RELATED_POSTS_AMOUNT
+from blog.serializers import (
+    get_likes_amount, select_comment_fields, select_post_fields,
+    serialize_comment, serialize_post, serialize_post_link, serialize_tag)
+from blog.sidebar import get_popular_tags
+from blog.slug_cache import get_post_or_404
+from blog.trending import TRENDING_POSTS_AMOUNT
+
+
+def get_most_popular_posts():
+    return select_post_fields(
+        Post.objects.trending())[:TRENDING_POSTS_AMOUNT]
+
+
+def is_liked(post_id, user):
+    # анонимам страница отдаётся из кэша, и лайка у них быть не может
+    return user.is_authenticated and likes_buffer.is_liked(post_id, user.id)
+
+
+def get_related_posts(post_id):
+    return [
+        serialize_post_link(post)
+        for post in Post.objects
+        .filter(related_backlinks__post_id=post_id)
+        .order_by('-related_backlinks__score')
+        .only('title', 'slug', 'published_at')[:RELATED_POSTS_AMOUNT]
+    ]
 
 
-def get_related_posts_count(tag):
-    return tag.posts.count()
+def serialize_pagination(posts_page, page, get_page_url):
+    previous_url = next_url = None
+    if posts_page.previous_cursor:
+        previous_url = get_page_url(
+            page - 1, before=posts_page.previous_cursor)
+    if posts_page.next_cursor:
+        next_url = get_page_url(page + 1, after=posts_page.next_cursor)
+    return {
+        'number': page,
+        'previous_url': previous_url,
+        'next_url': next_url,
+    }
+
+
+def get_comments_chunk(post_id, slug, after=None):
+    comments = select_comment_fields(Comment.objects.filter(post_id=post_id))
+    comments, next_cursor = paginate_comments(comments, after=after)
+    next_url = None
+    if next_cursor:
+        query = urlencode({'after': next_cursor})
+        next_url = f"{reverse('post_comments', args=[slug])}?{query}"
+    return [serialize_comment(comment) for comment in comments], next_url
 
 
-def serialize_post(post):
+def serialize_post_detail(post, serialized_comments, comments_next_url):
     return {
         'title': post.title,
-        'teaser_text': post.text[:200],
+        'text_html': post.text_html,
         'author': post.author.username,
-        'comments_amount': len(Comment.objects.filter(post=post)),
+        'comments': serialized_comments,
+        'comments_amount': post.comments_count,
+        'comments_next_url': comments_next_url,
+        'likes_amount': get_likes_amount(post),
         'image_url': post.image.url if post.image else None,
+        'image_srcsets': get_post_image_srcsets(post.image_hash),
         'published_at': post.published_at,
         'slug': post.slug,
         'tags': [serialize_tag(tag) for tag in post.tags.all()],
-        'first_tag_title': post.tags.all()[0].title,
     }
 
 
-def serialize_tag(tag):
+def get_comments_dates(post):
+    return (
+        post.comments
+        .order_by('-published_at')
+        .values_list('published_at', flat=True)
+    )
+
+
+def set_last_modified(response, post, last_comment_published_at):
+    last_modified = max(
+        filter(None, [post.published_at, last_comment_published_at]))
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+
+
+def get_fragment_cache_context():
     return {
-        'title': tag.title,
-        'posts_with_tag': len(Post.objects.filter(tags=tag)),
+        'fragment_cache_timeout': settings.PAGE_CACHE_TIMEOUT,
+        'cache_versions': get_versions(SIDEBAR_SCOPE),
     }
 
 
-def index(request):
+def get_page_number(value):
+    try:
+        page = int(value)
+    except (TypeError, ValueError):
+        raise Http404('Некорректный номер страницы')
+    if page < 1:
+        raise Http404('Некорректный номер страницы')
+    return page
 
-    most_popular_posts = []  # TODO. Как это посчитать?
 
-    fresh_posts = Post.objects.order_by('published_at')
-    most_fresh_posts = list(fresh_posts)[-5:]
+@query_budget(7)
+@reads_from_replica
+@cache_page_by_versions(lambda page=1: [FEED_SCOPE, SIDEBAR_SCOPE])
+def index(request, page=1):
+    most_popular_posts = get_most_popular_posts()
 
-    tags = Tag.objects.all()
-    popular_tags = sorted(tags, key=get_related_posts_count)
-    most_popular_tags = popular_tags[-5:]
+    posts_page = paginate_by_keyset(
+        select_post_fields(Post.objects.all()),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page=get_page_number(page),
+    )
+    if not posts_page.objects and page > 1:
+        raise Http404('Такой страницы нет')
+
+    def get_page_url(number, **cursor):
+        return f"{reverse('index', args=[number])}?{urlencode(cursor)}"
 
     context = {
         'most_popular_posts': [
             serialize_post(post) for post in most_popular_posts
         ],
-        'page_posts': [serialize_post(post) for post in most_fresh_posts],
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
+        'page_posts': attach_cache_versions(
+            [serialize_post(post) for post in posts_page.objects]),
+        'pagination': serialize_pagination(posts_page, page, get_page_url),
+        'popular_tags': get_popular_tags(),
+        'archive_months': get_archive_months(),
+        **get_fragment_cache_context(),
     }
     return render(request, 'index.html', context)
 
 
+@query_budget(10)
+@reads_from_replica
+@cache_page_by_versions(
+    lambda slug: [get_post_scope(slug), SIDEBAR_SCOPE, RELATED_SCOPE])
 def post_detail(request, slug):
-    post = Post.objects.get(slug=slug)
-    comments = Comment.objects.filter(post=post)
-    serialized_comments = []
-    for comment in comments:
-        serialized_comments.append({
-            'text': comment.text,
-            'published_at': comment.published_at,
-            'author': comment.author.username,
-        })
+    post = get_post_or_404(
+        Post.objects.prefetch_tags_with_counts().defer('text', 'teaser'),
+        slug)
+    serialized_comments, comments_next_url = get_comments_chunk(
+        post.id, post.slug)
 
-    likes = post.likes.all()
+    serialized_post = serialize_post_detail(
+        post, serialized_comments, comments_next_url)
 
-    related_tags = post.tags.all()
+    most_popular_posts = get_most_popular_posts()
 
-    serialized_post = {
-        'title': post.title,
-        'text': post.text,
-        'author': post.author.username,
-        'comments': serialized_comments,
-        'likes_amount': len(likes),
-        'image_url': post.image.url if post.image else None,
-        'published_at': post.published_at,
-        'slug': post.slug,
-        'tags': [serialize_tag(tag) for tag in related_tags],
+    context = {
+        'post': serialized_post,
+        'liked': is_liked(post.id, request.user),
+        'related_posts': get_related_posts(post.id),
+        'popular_tags': get_popular_tags(),
+        'archive_months': get_archive_months(),
+        'most_popular_posts': [
+            serialize_post(post) for post in most_popular_posts
+        ],
+        **get_fragment_cache_context(),
     }
+    response = render(request, 'post-details.html', context)
+    last_comment_published_at = get_comments_dates(post).first()
+    set_last_modified(response, post, last_comment_published_at)
+    return response
+
+
+@query_budget(4)
+@reads_from_replica
+@cache_page_by_versions(lambda slug: [get_post_scope(slug)])
+def post_comments(request, slug):
+    post = get_post_or_404(Post.objects.only('id'), slug)
+    comments, next_url = get_comments_chunk(
+        post.id, slug, after=request.GET.get('after'))
+    return JsonResponse({
+        'comments': comments,
+        'next_url': next_url,
+    })
+
+
+def get_comment_retry_after(request):
+    """Проверяет лимиты на комментарии для пользователя и его адреса."""
+    buckets = {
+        'user': f'comment:user:{request.user.id}',
+        'ip': f'comment:ip:{get_client_ip(request)}',
+    }
+    for limit_name, bucket_name in buckets.items():
+        capacity, refill_seconds = settings.COMMENT_RATE_LIMITS[limit_name]
+        retry_after = take_token(bucket_name, capacity, refill_seconds)
+        if retry_after:
+            return retry_after
+    return 0
+
 
-    all_tags = Tag.objects.all()
-    popular_tags = sorted(all_tags, key=get_related_posts_count)
-    most_popular_tags = popular_tags[-5:]
+@query_budget(5)
+@require_POST
+def add_comment(request, slug):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'error': 'Комментировать могут только вошедшие пользователи'},
+            status=403,
+        )
+    retry_after = get_comment_retry_after(request)
+    if retry_after:
+        response = JsonResponse(
+            {'error': 'Слишком много комментариев, попробуйте позже'},
+            status=429,
+        )
+        response['Retry-After'] = math.ceil(retry_after)
+        return response
 
-    most_popular_posts = []  # TODO. Как это посчитать?
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    post = get_post_or_404(Post.objects.only('id'), slug)
+    # счётчик, кэш и поисковый индекс обновит фоновая очередь, см. signals
+    comment = Comment.objects.create(
+        post=post,
+        author=request.user,
+        text=form.cleaned_data['text'],
+        published_at=timezone.now(),
+    )
+    return JsonResponse(serialize_comment(comment), status=201)
+
+
+@query_budget(8)
+@reads_from_replica
+@cache_page_by_versions(
+    lambda tag_slug: [get_tag_scope(tag_slug), SIDEBAR_SCOPE])
+def tag_filter(request, tag_slug):
+    tag = get_object_or_404(Tag, slug=tag_slug)
+
+    most_popular_posts = get_most_popular_posts()
+
+    page = get_page_number(request.GET.get('page', 1))
+    posts_page = paginate_tag_posts(
+        select_post_fields(Post.objects.all()),
+        tag.id,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page=page,
+    )
+
+    def get_page_url(number, **cursor):
+        query = urlencode({'page': number, **cursor})
+        return f"{reverse('tag_filter', args=[tag.slug])}?{query}"
 
     context = {
-        'post': serialized_post,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
+        'tag': tag.title,
+        'popular_tags': get_popular_tags(),
+        'archive_months': get_archive_months(),
+        'posts': attach_cache_versions(
+            [serialize_post(post) for post in posts_page.objects]),
+        'pagination': serialize_pagination(posts_page, page, get_page_url),
         'most_popular_posts': [
             serialize_post(post) for post in most_popular_posts
         ],
+        **get_fragment_cache_context(),
     }
-    return render(request, 'post-details.html', context)
+    return render(request, 'posts-list.html', context)
 
 
-def tag_filter(request, tag_title):
-    tag = Tag.objects.get(title=tag_title)
+@query_budget(7)
+@reads_from_replica
+@cache_page_by_versions(lambda year, month: [FEED_SCOPE, SIDEBAR_SCOPE])
+def archive(request, year, month):
+    try:
+        month_start, month_end = get_month_range(year, month)
+    except ValueError:
+        raise Http404('Такого месяца нет')
 
-    all_tags = Tag.objects.all()
-    popular_tags = sorted(all_tags, key=get_related_posts_count)
-    most_popular_tags = popular_tags[-5:]
+    most_popular_posts = get_most_popular_posts()
 
-    most_popular_posts = []  # TODO. Как это посчитать?
+    page = get_page_number(request.GET.get('page', 1))
+    posts_page = paginate_by_keyset(
+        select_post_fields(Post.objects.filter(
+            published_at__gte=month_start, published_at__lt=month_end)),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page=page,
+        per_page=ARCHIVE_POSTS_PER_PAGE,
+    )
+    if not posts_page.objects:
+        raise Http404('В этом месяце постов нет')
 
-    related_posts = tag.posts.all()[:20]
+    def get_page_url(number, **cursor):
+        query = urlencode({'page': number, **cursor})
+        return f"{reverse('archive', args=[year, month])}?{query}"
 
     context = {
-        'tag': tag.title,
-        'popular_tags': [serialize_tag(tag) for tag in most_popular_tags],
-        'posts': [serialize_post(post) for post in related_posts],
+        'archive_month': month_start.date(),
+        'popular_tags': get_popular_tags(),
+        'archive_months': get_archive_months(),
+        'posts': attach_cache_versions(
+            [serialize_post(post) for post in posts_page.objects]),
+        'pagination': serialize_pagination(posts_page, page, get_page_url),
         'most_popular_posts': [
             serialize_post(post) for post in most_popular_posts
         ],
+        **get_fragment_cache_context(),
     }
     return render(request, 'posts-list.html', context)
 
 
+@query_budget(7)
+@reads_from_replica
+@cache_page_by_versions(lambda: [FEED_SCOPE, SIDEBAR_SCOPE])
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = get_page_number(request.GET.get('page', 1))
+    results, next_cursor = [], None
+    if query:
+        results, next_cursor = search_posts(
+            query, after=request.GET.get('after'))
+
+    next_url = None
+    if next_cursor:
+        next_query = urlencode(
+            {'q': query, 'page': page + 1, 'after': next_cursor})
+        next_url = f"{reverse('search')}?{next_query}"
+
+    serialized_posts = []
+    for post, snippet in results:
+        serialized_post = serialize_post(post)
+        serialized_post['snippet'] = snippet
+        serialized_posts.append(serialized_post)
+
+    context = {
+        'query': query,
+        'posts': serialized_posts,
+        'pagination': {
+            'number': page,
+            'previous_url': None,
+            'next_url': next_url,
+        },
+        'popular_tags': get_popular_tags(),
+        'archive_months': get_archive_months(),
+        'most_popular_posts': [
+            serialize_post(post) for post in get_most_popular_posts()
+        ],
+        **get_fragment_cache_context(),
+    }
+    return render(request, 'search.html', context)
+
+
+@query_budget(6)
+@require_POST
+def like_post(request, slug):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'error': 'Лайкать посты могут только вошедшие пользователи'},
+            status=403,
+        )
+    post = get_post_or_404(Post.objects.only('id', 'likes_count'), slug)
+    liked = request.POST.get('action', 'like') == 'like'
+    likes_buffer.set_liked(post.id, request.user.id, liked)
+    return JsonResponse({
+        'liked': liked,
+        'likes_amount': get_likes_amount(post),
+    })
+
+
 def contacts(request):
-    # позже здесь будет код для статистики заходов на эту страницу
-    # и для записи фидбека
+    # заходы на страницу считает PageViewMiddleware,
+    # позже здесь будет код для записи фидбека
     return render(request, 'contacts.html', {})
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from blog import async_views
+from sensive_blog import urls
+
+
+# под ASGI ленты и страница поста обслуживаются асинхронными view,
+# остальные адреса те же, что и у WSGI
+urlpatterns = [
+    path('page/<int:page>', async_views.index, name='index'),
+    path('post/<slug:slug>', async_views.post_detail, name='post_detail'),
+    path('tag/<str:tag_slug>', async_views.tag_filter, name='tag_filter'),
+    path('', async_views.index, name='index'),
+    *urls.urlpatterns,
+]
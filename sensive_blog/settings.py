@@ -1,4 +1,6 @@
 import os
+
+import dj_database_url
 from environs import Env
 
 env = Env()
@@ -25,7 +27,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'blog.middleware.StaticFilesMiddleware',
+    'blog.middleware.PageViewMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -34,17 +39,72 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'sensive_blog.urls'
+QUERY_INSTRUMENTATION = env.bool('QUERY_INSTRUMENTATION', False)
+QUERY_INSTRUMENTATION_SAMPLE_RATE = env.float(
+    'QUERY_INSTRUMENTATION_SAMPLE_RATE', 0.01)
+QUERY_INSTRUMENTATION_STRICT = env.bool('QUERY_INSTRUMENTATION_STRICT', False)
+QUERY_INSTRUMENTATION_MODULES = ['blog.views', 'blog.serializers']
+QUERY_BUDGET = env.int('QUERY_BUDGET', 10)
+N_PLUS_ONE_THRESHOLD = env.int('N_PLUS_ONE_THRESHOLD', 5)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'blog.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+ROOT_URLCONF = env.str('ROOT_URLCONF', 'sensive_blog.urls')
 
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
-STATIC_ROOT = ''
+STATIC_ROOT = env.str('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'blog.storage.IncrementalCompressedManifestStorage',
+    },
+}
+
+STATIC_BUNDLES = {
+    'vendor.css': [
+        'vendors/bootstrap/bootstrap.min.css',
+        'vendors/fontawesome/css/all.min.css',
+        'vendors/themify-icons/themify-icons.css',
+        'vendors/linericon/style.css',
+        'vendors/owl-carousel/owl.theme.default.min.css',
+        'vendors/owl-carousel/owl.carousel.min.css',
+    ],
+    'vendor.js': [
+        'vendors/jquery/jquery-3.2.1.min.js',
+        'vendors/bootstrap/bootstrap.bundle.min.js',
+        'vendors/owl-carousel/owl.carousel.min.js',
+        'js/jquery.ajaxchimp.min.js',
+    ],
+}
+STATIC_BUNDLES_ENABLED = env.bool('STATIC_BUNDLES_ENABLED', not DEBUG)
+STATIC_BUNDLES_DIR = os.path.join(BASE_DIR, 'build', 'bundles')
+if STATIC_BUNDLES_ENABLED:
+    STATICFILES_DIRS.append(('bundles', STATIC_BUNDLES_DIR))
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'blog.instrumentation.DjangoTemplates',
         'DIRS': [TEMPLATE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -60,14 +120,59 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'sensive_blog.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': env.str(
-            'DATABASE_FILEPATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', 60)
+
+if env.str('DATABASE_URL', ''):
+    DATABASES = {
+        'default': env.dj_db_url(
+            'DATABASE_URL',
+            conn_max_age=DATABASE_CONN_MAX_AGE,
+            conn_health_checks=True),
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env.str(
+                'DATABASE_FILEPATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': env.str(
+                    'SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            },
+        }
+    }
+
+for number, replica_url in enumerate(env.list('DATABASE_REPLICA_URLS', [])):
+    DATABASES[f'replica_{number}'] = {
+        **dj_database_url.parse(
+            replica_url,
+            conn_max_age=DATABASE_CONN_MAX_AGE,
+            conn_health_checks=True),
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['blog.db.ReadReplicaRouter']
+
+SQLITE_PRAGMAS = {
+    'journal_mode': env.str('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': env.str('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+    # отрицательное значение — размер кэша в килобайтах, а не в страницах
+    'cache_size': env.int('SQLITE_CACHE_SIZE', -64 * 1024),
+    'temp_store': env.str('SQLITE_TEMP_STORE', 'MEMORY'),
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', 5000),
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+
+SIDEBAR_CACHE_TIMEOUT = env.int('SIDEBAR_CACHE_TIMEOUT', 5 * 60)
+
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', 10 * 60)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',  # noqa: E501
@@ -98,4 +203,52 @@ STATIC_URL = '/static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+RENDITION_WORKERS = env.int('RENDITION_WORKERS', 2)
+
+SEARCH_INCLUDE_COMMENTS = env.bool('SEARCH_INCLUDE_COMMENTS', True)
+SEARCH_COMMENTS_INDEX_INTERVAL = env.float(
+    'SEARCH_COMMENTS_INDEX_INTERVAL', 5)
+
+LIKES_FLUSH_INTERVAL = env.float('LIKES_FLUSH_INTERVAL', 1.0)
+LIKES_BUFFER_MAX_SIZE = env.int('LIKES_BUFFER_MAX_SIZE', 10000)
+LIKES_FLUSH_BATCH_SIZE = env.int('LIKES_FLUSH_BATCH_SIZE', 500)
+
+PAGE_VIEWS_URL_NAMES = [
+    'index', 'post_detail', 'tag_filter', 'archive', 'search', 'contacts',
+]
+PAGE_VIEWS_FLUSH_INTERVAL = env.float('PAGE_VIEWS_FLUSH_INTERVAL', 10)
+PAGE_VIEWS_FLUSH_BATCH_SIZE = 200
+
+TRENDING_HALF_LIFE_HOURS = env.float('TRENDING_HALF_LIFE_HOURS', 48)
+TRENDING_WEIGHTS = {
+    'likes': 1,
+    'comments': 3,
+    'views': 0.05,
+}
+
+RELATED_POSTS_CANDIDATES_PER_TAG = env.int(
+    'RELATED_POSTS_CANDIDATES_PER_TAG', 50)
+
+POST_SLUG_CACHE_SIZE = env.int('POST_SLUG_CACHE_SIZE', 10000)
+
+ADMIN_EXACT_COUNT_LIMIT = env.int('ADMIN_EXACT_COUNT_LIMIT', 100000)
+
+STATIC_SITE_DIR = env.str(
+    'STATIC_SITE_DIR', os.path.join(BASE_DIR, 'build', 'site'))
+
+TASKS_BATCH_SIZE = env.int('TASKS_BATCH_SIZE', 100)
+TASKS_EAGER = env.bool('TASKS_EAGER', False)
+
+# ёмкость корзины и раз во сколько секунд в неё добавляется жетон
+COMMENT_RATE_LIMITS = {
+    'user': (
+        env.int('COMMENT_USER_BURST', 5),
+        env.float('COMMENT_USER_REFILL_SECONDS', 30),
+    ),
+    'ip': (
+        env.int('COMMENT_IP_BURST', 20),
+        env.float('COMMENT_IP_REFILL_SECONDS', 6),
+    ),
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from blog import views
+from blog import api, feeds, views
 from django.urls import path
 
 from django.conf.urls.static import static
@@ -9,8 +9,44 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('page/<int:page>', views.index, name='index'),
     path('post/<slug:slug>', views.post_detail, name='post_detail'),
-    path('tag/<slug:tag_title>', views.tag_filter, name='tag_filter'),
+    path(
+        'post/<slug:slug>/comments',
+        views.post_comments,
+        name='post_comments',
+    ),
+    path(
+        'post/<slug:slug>/comments/new',
+        views.add_comment,
+        name='add_comment',
+    ),
+    path('post/<slug:slug>/like', views.like_post, name='like_post'),
+    path('tag/<str:tag_slug>', views.tag_filter, name='tag_filter'),
+    path(
+        'tag/<str:tag_slug>/feed/<str:feed_format>',
+        feeds.tag_feed,
+        name='tag_feed',
+    ),
+    path('feed/<str:feed_format>', feeds.posts_feed, name='posts_feed'),
+    path(
+        'archive/<int:year>/<int:month>',
+        views.archive,
+        name='archive',
+    ),
+    path('search/', views.search, name='search'),
     path('contacts/', views.contacts, name='contacts'),
+    path('api/v1/posts', api.posts_list, name='api_posts'),
+    path('api/v1/posts/<slug:slug>', api.post_detail, name='api_post'),
+    path(
+        'api/v1/posts/<slug:slug>/comments',
+        api.post_comments,
+        name='api_post_comments',
+    ),
+    path('api/v1/tags', api.tags_list, name='api_tags'),
+    path(
+        'api/v1/tags/<str:tag_slug>/posts',
+        api.tag_posts,
+        name='api_tag_posts',
+    ),
     path('', views.index, name='index'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
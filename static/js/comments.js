@@ -0,0 +1,56 @@
+$(function() {
+  "use strict";
+
+  // Комментарии к посту дочитываются порциями по кнопке «Load more comments».
+  var $button = $('#load-comments');
+  var $list = $('#comment-list');
+
+  function renderComment(comment) {
+    var $desc = $('<div class="desc">')
+      .append($('<h5>').append($('<a href="#">').text(comment.author)))
+      .append($('<p class="date">').text(new Date(comment.published_at).toLocaleString()))
+      .append($('<p class="comment">').text(comment.text));
+    var $user = $('<div class="user justify-content-between d-flex">')
+      .append('<div class="thumb"><img src="#" alt=""></div>')
+      .append($desc);
+    return $('<div class="single-comment justify-content-between d-flex" style="margin-bottom: 15px;">')
+      .append($user);
+  }
+
+  // Новый комментарий отправляется без перезагрузки и сразу попадает в список.
+  var $form = $('#comment-form');
+  var $error = $('#comment-form-error');
+
+  $form.on('submit', function(event) {
+    event.preventDefault();
+    var $submit = $form.find('button[type="submit"]').prop('disabled', true);
+    $error.text('');
+    $.post($form.attr('action'), $form.serialize(), function(comment) {
+      $list.append(renderComment(comment));
+      $form.find('textarea').val('');
+    }).fail(function(xhr) {
+      var response = xhr.responseJSON || {};
+      $error.text(response.error || $.map(response.errors || {}, function(messages) {
+        return messages.join(' ');
+      }).join(' ') || 'Не удалось отправить комментарий');
+    }).always(function() {
+      $submit.prop('disabled', false);
+    });
+  });
+
+  $button.on('click', function() {
+    $button.prop('disabled', true);
+    $.getJSON($button.data('url'), function(chunk) {
+      $.each(chunk.comments, function(_, comment) {
+        $list.append(renderComment(comment));
+      });
+      if (chunk.next_url) {
+        $button.data('url', chunk.next_url).prop('disabled', false);
+      } else {
+        $button.remove();
+      }
+    }).fail(function() {
+      $button.prop('disabled', false);
+    });
+  });
+});
@@ -0,0 +1,27 @@
+$(function() {
+  "use strict";
+
+  // Лайк ставится и снимается повторным нажатием на сердечко.
+  // Стоит ли уже лайк, сервер пишет в data-liked при рендере страницы.
+  var $link = $('#like-post');
+  var $amount = $('#likes-amount');
+  var liked = $link.data('liked') === true;
+
+  function getCookie(name) {
+    var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+    return match ? decodeURIComponent(match[1]) : null;
+  }
+
+  $link.on('click', function(event) {
+    event.preventDefault();
+    $.ajax({
+      url: $link.data('url'),
+      method: 'POST',
+      data: {action: liked ? 'unlike' : 'like'},
+      headers: {'X-CSRFToken': getCookie('csrftoken')},
+    }).done(function(response) {
+      liked = response.liked;
+      $amount.text(response.likes_amount);
+    });
+  });
+});